@@ -1,6 +1,9 @@
 // Base path for interpolation images (served as static files)
 export const interpolationBase = '/interpolation/forecast_interpolation';
 
+// Per-day XYZ tiles, served by the Netlify function from dataset storage
+export const interpolationTilesBase = '/.netlify/functions/api?type=tile';
+
 // Fetch predictions from static file (committed by Hopsworks job)
 export async function fetchPredictions() {
   try {
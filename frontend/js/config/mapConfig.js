@@ -3,11 +3,18 @@
 // Color scales
 // Layer configuration
 
-export function buildMapConfig(gridBounds, interpolationBase) {
+export function buildMapConfig(gridBounds, interpolationBase, interpolationTilesBase) {
   const config = {
     forecastDays: [0, 1, 2, 3, 4, 5, 6],
     interpolationBase: interpolationBase,
     interpolationTemplate: 'forecast_interpolation_{day}d.png',
+    interpolationTilesBase: interpolationTilesBase,
+    // Zoom levels written by utils/map_tiles.py; the map upsamples beyond maxZoom
+    tileMinZoom: 0,
+    tileMaxZoom: 7,
+    // "tiles" loads pre-coloured tiles; "grid" colours the binary grid file client-side
+    overlayFormat: 'tiles',
+    interpolationGridUrl: '/interpolation/forecast_grids.bin',
     predictionsCsv: './models/predictions.csv',
     mapBounds: [
       gridBounds.MIN_LONGITUDE,
@@ -1,6 +1,7 @@
 import {
   fetchPredictions,
   interpolationBase,
+  interpolationTilesBase,
 } from "./api.js";
 import { buildMapConfig } from "./config/mapConfig.js";
 import {
@@ -44,6 +45,7 @@ async function main() {
   const config = buildMapConfig(
     gridBounds,
     interpolationBase,
+    interpolationTilesBase,
   );
 
   state.currentDay = 0; // Default to today
@@ -130,7 +132,7 @@ async function main() {
               err,
             );
             console.error(
-              "   Image URL:",
+              "   Tile URL:",
               buildRasterUrl(state.currentDay, config),
             );
             // Don't disable the toggle - user might want to try other days
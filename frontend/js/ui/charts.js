@@ -0,0 +1,158 @@
+// Client-side forecast/hindcast charts drawn from sensor_charts.json
+// (written by visualization.export_chart_data), styled like the old PNG plots.
+
+const WIDTH = 1000;
+const HEIGHT = 600;
+const MARGIN = { top: 40, right: 20, bottom: 90, left: 60 };
+const Y_TICKS = [10, 25, 50, 100, 250, 500];
+
+const BANDS = [
+  { from: 1, to: 49, color: 'rgba(0, 128, 0, 0.3)', label: 'Good: 0-49' },
+  { from: 50, to: 99, color: 'rgba(255, 255, 0, 0.3)', label: 'Moderate: 50-99' },
+  { from: 100, to: 149, color: 'rgba(255, 165, 0, 0.3)', label: 'Unhealthy for Some: 100-149' },
+  { from: 150, to: 199, color: 'rgba(255, 0, 0, 0.3)', label: 'Unhealthy: 150-199' },
+  { from: 200, to: 299, color: 'rgba(128, 0, 128, 0.3)', label: 'Very Unhealthy: 200-299' },
+  { from: 300, to: 500, color: 'rgba(139, 0, 0, 0.3)', label: 'Hazardous: 300-500' },
+];
+
+let chartDataPromise = null;
+
+// Fetch sensor_charts.json once; resolves to null when it is not deployed
+export function loadChartData(url = './sensor_charts.json') {
+  chartDataPromise ??= fetch(url)
+    .then((res) => (res.ok ? res.json() : null))
+    .catch(() => null);
+  return chartDataPromise;
+}
+
+// { dates, series } for one sensor and kind ("forecast" | "hindcast"), or null
+export function sensorChartSeries(chartData, sensorId, kind) {
+  const section = chartData?.[kind];
+  const entry = section?.sensors?.[String(sensorId)];
+  if (!entry) return null;
+
+  if (kind === 'forecast') {
+    return {
+      dates: section.dates,
+      series: [{ label: 'Predicted PM2.5', values: entry, color: 'red', marker: 'circle', fill: 'blue' }],
+    };
+  }
+  return {
+    dates: section.dates,
+    series: [
+      { label: 'Predicted PM2.5', values: entry.predicted, color: 'red', marker: 'circle', fill: 'blue' },
+      { label: 'Actual PM2.5', values: entry.actual, color: 'black', marker: 'triangle', fill: 'grey' },
+    ],
+  };
+}
+
+function drawMarker(ctx, x, y, shape, fill, stroke) {
+  ctx.beginPath();
+  if (shape === 'triangle') {
+    ctx.moveTo(x, y - 5);
+    ctx.lineTo(x + 4.5, y + 3.5);
+    ctx.lineTo(x - 4.5, y + 3.5);
+    ctx.closePath();
+  } else {
+    ctx.arc(x, y, 4, 0, 2 * Math.PI);
+  }
+  ctx.fillStyle = fill;
+  ctx.fill();
+  ctx.strokeStyle = stroke;
+  ctx.lineWidth = 1;
+  ctx.stroke();
+}
+
+// Draw a log-scale PM2.5 chart with AQI bands; returns a PNG data URL
+export function renderChart({ dates, series, title }) {
+  const canvas = document.createElement('canvas');
+  canvas.width = WIDTH;
+  canvas.height = HEIGHT;
+  const ctx = canvas.getContext('2d');
+  ctx.fillStyle = 'white';
+  ctx.fillRect(0, 0, WIDTH, HEIGHT);
+
+  const plotWidth = WIDTH - MARGIN.left - MARGIN.right;
+  const plotHeight = HEIGHT - MARGIN.top - MARGIN.bottom;
+
+  const finite = series.flatMap((s) => s.values.filter((v) => v > 0));
+  const top = Math.max(500, ...finite);
+  const logTop = Math.log10(top);
+  const y = (v) => MARGIN.top + plotHeight * (1 - Math.log10(Math.max(v, 1)) / logTop);
+  const step = dates.length > 1 ? plotWidth / (dates.length - 1) : 0;
+  const x = (i) => MARGIN.left + (dates.length > 1 ? i * step : plotWidth / 2);
+
+  // AQI bands
+  BANDS.forEach((band) => {
+    ctx.fillStyle = band.color;
+    ctx.fillRect(MARGIN.left, y(band.to), plotWidth, y(band.from) - y(band.to));
+  });
+
+  // Axes and y ticks
+  ctx.strokeStyle = 'black';
+  ctx.lineWidth = 1;
+  ctx.strokeRect(MARGIN.left, MARGIN.top, plotWidth, plotHeight);
+  ctx.fillStyle = 'black';
+  ctx.font = '12px sans-serif';
+  ctx.textAlign = 'right';
+  ctx.textBaseline = 'middle';
+  Y_TICKS.forEach((tick) => ctx.fillText(String(tick), MARGIN.left - 6, y(tick)));
+
+  // Roughly 10 date labels, rotated like the matplotlib plots
+  const every = Math.max(1, Math.ceil(dates.length / 10));
+  ctx.textAlign = 'right';
+  dates.forEach((date, i) => {
+    if (i % every) return;
+    ctx.save();
+    ctx.translate(x(i), MARGIN.top + plotHeight + 8);
+    ctx.rotate(-Math.PI / 4);
+    ctx.fillText(date, 0, 0);
+    ctx.restore();
+  });
+
+  // Series: lines broken at missing values, then markers
+  series.forEach((s) => {
+    ctx.strokeStyle = s.color;
+    ctx.lineWidth = 2;
+    ctx.beginPath();
+    let drawing = false;
+    s.values.forEach((v, i) => {
+      if (v === null || !(v > 0)) {
+        drawing = false;
+        return;
+      }
+      if (drawing) ctx.lineTo(x(i), y(v));
+      else ctx.moveTo(x(i), y(v));
+      drawing = true;
+    });
+    ctx.stroke();
+    s.values.forEach((v, i) => {
+      if (v > 0) drawMarker(ctx, x(i), y(v), s.marker, s.fill, s.color);
+    });
+  });
+
+  // Legend and title
+  ctx.textAlign = 'left';
+  series.forEach((s, i) => {
+    const ly = MARGIN.top + 14 + i * 18;
+    ctx.fillStyle = s.color;
+    ctx.fillRect(MARGIN.left + 10, ly - 1, 20, 2);
+    ctx.fillStyle = 'black';
+    ctx.fillText(s.label, MARGIN.left + 36, ly);
+  });
+  const legendX = MARGIN.left + plotWidth - 190;
+  ctx.font = '11px sans-serif';
+  BANDS.forEach((band, i) => {
+    const ly = MARGIN.top + 14 + i * 15;
+    ctx.fillStyle = band.color.replace('0.3)', '1)');
+    ctx.fillRect(legendX, ly - 5, 14, 10);
+    ctx.fillStyle = 'black';
+    ctx.fillText(band.label, legendX + 20, ly);
+  });
+
+  ctx.font = '16px sans-serif';
+  ctx.textAlign = 'center';
+  ctx.fillText(title, MARGIN.left + plotWidth / 2, MARGIN.top / 2);
+
+  return canvas.toDataURL('image/png');
+}
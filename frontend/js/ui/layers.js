@@ -1,5 +1,9 @@
 import { getAQIColor } from "../config/mapConfig.js";
-import { deriveDayDates } from "../utils/index.js";
+import {
+  deriveDayDates,
+  fetchGridBinary,
+  renderGridImage,
+} from "../utils/index.js";
 
 export const sourceId = "pm25-interpolation";
 export const layerId = "pm25-interpolation-layer";
@@ -25,22 +29,37 @@ export async function loadRaster(map, config, day, state) {
 
   const url = buildRasterUrl(day, config);
 
-  map.addSource(sourceId, {
-    type: "image",
-    url: url,
-    coordinates: [
-      [config.mapBounds[0], config.mapBounds[3]],
-      [config.mapBounds[2], config.mapBounds[3]],
-      [config.mapBounds[2], config.mapBounds[1]],
-      [config.mapBounds[0], config.mapBounds[1]],
-    ],
-  });
+  if (config.overlayFormat === "grid") {
+    // One binary file holds every day's grid; it is fetched once and coloured in the browser
+    state.gridPayload ??= await fetchGridBinary(config.interpolationGridUrl);
+    const [minLon, minLat, maxLon, maxLat] = state.gridPayload.bounds;
+    map.addSource(sourceId, {
+      type: "image",
+      url: renderGridImage(state.gridPayload, day),
+      coordinates: [
+        [minLon, maxLat],
+        [maxLon, maxLat],
+        [maxLon, minLat],
+        [minLon, minLat],
+      ],
+    });
+  } else {
+    // Tiled source: only the tiles in view are requested, at the zoom shown
+    map.addSource(sourceId, {
+      type: "raster",
+      tiles: [url],
+      tileSize: 256,
+      bounds: config.mapBounds,
+      minzoom: config.tileMinZoom,
+      maxzoom: config.tileMaxZoom,
+    });
+  }
 
   // Listen for source data events to detect load failures
   map.once("error", (e) => {
     if (e.sourceId === sourceId) {
       console.error(
-        `❌ Failed to load raster image for day ${day}`,
+        `❌ Failed to load raster tiles for day ${day}`,
       );
       console.error(`   URL: ${url}`);
       console.error(`   Error:`, e.error);
@@ -74,7 +93,8 @@ export function removeRasterLayer(map) {
 }
 
 export function buildRasterUrl(day, config) {
-  return `${config.interpolationBase}_${day}d.png`;
+  if (config.overlayFormat === "grid") return config.interpolationGridUrl;
+  return `${config.interpolationTilesBase}&day=${day}&z={z}&x={x}&y={y}`;
 }
 
 export function waitForStyle(map) {
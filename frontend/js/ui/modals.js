@@ -1,5 +1,6 @@
 import { HIDDEN_COLUMNS } from '../config/mapConfig.js';
 import { state, ui } from './index.js';
+import { loadChartData, renderChart, sensorChartSeries } from './charts.js';
 
 // Global date string for forecast/hindcast filenames
 const today_short = new Date().toISOString().slice(0, 10);
@@ -109,10 +110,32 @@ export async function openDetailsModal(sensorId) {
     }
   }
 
-  const [hasForecast, hasHindcast] = await Promise.all([
-    imageExists(forecastPath),
-    imageExists(hindcastPath),
-  ]);
+  // Charts drawn from sensor_charts.json; pre-rendered PNGs only when a sensor has no chart data
+  const chartData = await loadChartData();
+  const forecastSeries = sensorChartSeries(chartData, sensorId, 'forecast');
+  const hindcastSeries = sensorChartSeries(chartData, sensorId, 'hindcast');
+  const place = [entry.city, entry.street].filter(Boolean).join(', ');
+
+  let forecastUrl = null;
+  let hindcastUrl = null;
+  if (forecastSeries || hindcastSeries) {
+    if (forecastSeries) {
+      forecastUrl = renderChart({ ...forecastSeries, title: `PM2.5 Predicted (Logarithmic Scale) for ${place}` });
+    }
+    if (hindcastSeries) {
+      hindcastUrl = renderChart({ ...hindcastSeries, title: `PM2.5 Predicted vs Actual for ${place}` });
+    }
+  } else {
+    const [hasForecastPng, hasHindcastPng] = await Promise.all([
+      imageExists(forecastPath),
+      imageExists(hindcastPath),
+    ]);
+    if (hasForecastPng) forecastUrl = forecastPath;
+    if (hasHindcastPng) hindcastUrl = hindcastPath;
+  }
+
+  const hasForecast = forecastUrl !== null;
+  const hasHindcast = hindcastUrl !== null;
 
   const plotRow = ensureDetailsPlotsContainer();
   const tableWrapper = ui.detailsModal.querySelector('.details-table-wrapper');
@@ -128,7 +151,7 @@ export async function openDetailsModal(sensorId) {
       updateDetailsImage(
         'details-forecast-card',
         'details-forecast-thumb',
-        forecastPath,
+        forecastUrl,
       );
     } else {
       hideDetailsImage('details-forecast-card', 'details-forecast-thumb');
@@ -138,7 +161,7 @@ export async function openDetailsModal(sensorId) {
       updateDetailsImage(
         'details-hindcast-card',
         'details-hindcast-thumb',
-        hindcastPath,
+        hindcastUrl,
       );
     } else {
       hideDetailsImage('details-hindcast-card', 'details-hindcast-thumb');
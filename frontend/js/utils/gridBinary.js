@@ -0,0 +1,170 @@
+// Reader for the interpolation grids written by utils/visualization.py
+// (export_grid_binary), coloured in the browser through a canvas LUT.
+
+const HEADER_BYTES = 48;
+const HORIZON_BYTES = 12;
+const NODATA = 255;
+
+const DEFAULT_COLORS = [
+  '#00e400', '#7de400', '#ffff00', '#ffb000',
+  '#ff7e00', '#ff4000', '#ff0000', '#c0007f',
+  '#8f3f97', '#7e0023',
+];
+
+function float16ToNumber(bits) {
+  const exponent = (bits >> 10) & 0x1f;
+  const fraction = bits & 0x3ff;
+  const sign = bits & 0x8000 ? -1 : 1;
+  if (exponent === 0) return sign * 2 ** -14 * (fraction / 1024);
+  if (exponent === 0x1f) return fraction ? NaN : sign * Infinity;
+  return sign * 2 ** (exponent - 15) * (1 + fraction / 1024);
+}
+
+async function inflate(bytes) {
+  const stream = new Blob([bytes])
+    .stream()
+    .pipeThrough(new DecompressionStream('deflate'));
+  return new Uint8Array(await new Response(stream).arrayBuffer());
+}
+
+export async function fetchGridBinary(url) {
+  const res = await fetch(url);
+  if (!res.ok) throw new Error(`Grid file not available: ${url}`);
+  return parseGridBinary(await res.arrayBuffer());
+}
+
+export async function parseGridBinary(buffer) {
+  const view = new DataView(buffer);
+  const magic = String.fromCharCode(
+    ...new Uint8Array(buffer, 0, 4),
+  );
+  if (magic !== 'PMGR' || view.getUint8(4) !== 1) {
+    throw new Error('Not a version 1 PM2.5 grid file');
+  }
+
+  const dtype = view.getUint8(5) === 1 ? 'uint8' : 'float16';
+  const compressed = view.getUint8(6) === 1;
+  const horizonCount = view.getUint16(8, true);
+  const rows = view.getUint16(10, true);
+  const cols = view.getUint16(12, true);
+  const bounds = [0, 1, 2, 3].map((i) =>
+    view.getFloat64(16 + i * 8, true),
+  );
+
+  const horizons = [];
+  for (let h = 0; h < horizonCount; h += 1) {
+    const at = HEADER_BYTES + h * HORIZON_BYTES;
+    horizons.push({
+      daysAhead: view.getInt16(at, true),
+      scale: view.getFloat32(at + 4, true),
+      offset: view.getFloat32(at + 8, true),
+    });
+  }
+
+  let cells = new Uint8Array(
+    buffer,
+    HEADER_BYTES + horizonCount * HORIZON_BYTES,
+  );
+  if (compressed) cells = await inflate(cells);
+  if (dtype === 'float16') {
+    cells = new Uint16Array(
+      cells.buffer,
+      cells.byteOffset,
+      cells.byteLength / 2,
+    );
+  }
+
+  return { dtype, rows, cols, bounds, horizons, cells };
+}
+
+// Values of one horizon as a Float32Array (row 0 = southernmost latitude), NaN where empty
+export function gridValues(grid, daysAhead) {
+  const h = grid.horizons.findIndex((x) => x.daysAhead === daysAhead);
+  if (h < 0) return null;
+
+  const size = grid.rows * grid.cols;
+  const values = new Float32Array(size);
+  const { scale, offset } = grid.horizons[h];
+  for (let i = 0; i < size; i += 1) {
+    const code = grid.cells[h * size + i];
+    if (grid.dtype === 'uint8') {
+      values[i] = code === NODATA ? NaN : offset + code * scale;
+    } else {
+      values[i] = float16ToNumber(code);
+    }
+  }
+  return values;
+}
+
+function hexToRgb(hex) {
+  const n = parseInt(hex.slice(1), 16);
+  return [(n >> 16) & 255, (n >> 8) & 255, n & 255];
+}
+
+// 256-entry RGB table linearly blending the colour stops
+export function buildColorLut(colors = DEFAULT_COLORS, size = 256) {
+  const stops = colors.map(hexToRgb);
+  const lut = new Uint8ClampedArray(size * 3);
+  for (let i = 0; i < size; i += 1) {
+    const position = (i / (size - 1)) * (stops.length - 1);
+    const lower = Math.min(Math.floor(position), stops.length - 2);
+    const t = position - lower;
+    for (let c = 0; c < 3; c += 1) {
+      lut[i * 3 + c] = Math.round(
+        stops[lower][c] * (1 - t) + stops[lower + 1][c] * t,
+      );
+    }
+  }
+  return lut;
+}
+
+// Data URL of one horizon coloured through the LUT, north up; vmin/vmax default as in the pipeline
+export function renderGridImage(
+  grid,
+  daysAhead,
+  { lut = buildColorLut(), alpha = 0.65, vmin, vmax } = {},
+) {
+  const values = gridValues(grid, daysAhead);
+  if (!values) return null;
+
+  let low = Infinity;
+  let high = -Infinity;
+  values.forEach((v) => {
+    if (Number.isFinite(v)) {
+      low = Math.min(low, v);
+      high = Math.max(high, v);
+    }
+  });
+  const from = vmin ?? Math.max(0, low);
+  const to = vmax ?? Math.max(high, 500);
+  const entries = lut.length / 3;
+  const factor = (entries - 1) / Math.max(to - from, 1e-12);
+
+  const canvas = document.createElement('canvas');
+  canvas.width = grid.cols;
+  canvas.height = grid.rows;
+  const context = canvas.getContext('2d');
+  const image = context.createImageData(grid.cols, grid.rows);
+  const pixels = image.data;
+  const opacity = Math.round(alpha * 255);
+
+  for (let row = 0; row < grid.rows; row += 1) {
+    const source = (grid.rows - 1 - row) * grid.cols;
+    for (let col = 0; col < grid.cols; col += 1) {
+      const v = values[source + col];
+      const out = (row * grid.cols + col) * 4;
+      if (Number.isNaN(v)) continue;
+      const index = Math.min(
+        entries - 1,
+        Math.max(0, Math.floor((v - from) * factor + 0.5)),
+      );
+      pixels[out] = lut[index * 3];
+      pixels[out + 1] = lut[index * 3 + 1];
+      pixels[out + 2] = lut[index * 3 + 2];
+      pixels[out + 3] = opacity;
+    }
+  }
+
+  context.putImageData(image, 0, 0);
+  return canvas.toDataURL('image/png');
+}
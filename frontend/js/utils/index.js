@@ -2,3 +2,4 @@ export * from './dateUtils.js';
 export * from './coordinates.js';
 export * from './csv.js';
 export * from './valueUtils.js';
+export * from './gridBinary.js';
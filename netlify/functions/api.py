@@ -1,36 +1,197 @@
+import base64
+import io
 import json
 import os
+import tempfile
+import time
+import zipfile
+
 import hopsworks
 import pandas as pd
 
+AUTH_ERROR_CODES = (401, 403)      # Responses that mean the session is no longer valid
+MAX_CONNECTION_AGE = 6 * 60 * 60   # Seconds before a warm connection is renewed anyway
+TILE_ARCHIVE_DIR = "Resources/airquality/tiles"  # {day}d.zip per horizon, from utils/map_tiles.publish_tiles
+TILE_ARCHIVE_TTL = 10 * 60         # Seconds a downloaded tile archive is served before it is fetched again
+
+
+class HopsworksConnection:
+    """
+    Hopsworks handles kept at module scope, so warm invocations of the
+    function reuse them instead of logging in again.
+
+    The project, feature store and dataset API are created on first use.
+    run(fn) calls fn(connection) and, if Hopsworks rejects the session
+    (401/403), logs in again once and retries.
+    """
+
+    def __init__(self):
+        self._project = None
+        self._fs = None
+        self._dataset_api = None
+        self.connected_at = None
+        self.logins = 0
+        self.reconnects = 0
+        self.connect_seconds = 0.0  # Time spent creating handles during the current invocation
+
+    def _login(self):
+        api_key = os.environ.get("HOPSWORKS_API_KEY")
+        if not api_key:
+            raise RuntimeError("HOPSWORKS_API_KEY not configured")
+
+        start = time.perf_counter()
+        self._project = hopsworks.login(api_key_value=api_key)
+        self._fs = None
+        self._dataset_api = None
+        self.connected_at = time.time()
+        self.logins += 1
+        self.connect_seconds += time.perf_counter() - start
+
+    def reset(self):
+        self._project = None
+        self._fs = None
+        self._dataset_api = None
+        self.connected_at = None
+        try:
+            hopsworks.logout()
+        except Exception:
+            pass
+
+    @property
+    def project(self):
+        if self._project is None or time.time() - self.connected_at > MAX_CONNECTION_AGE:
+            self._login()
+        return self._project
+
+    @property
+    def fs(self):
+        if self._fs is None:
+            project = self.project
+            start = time.perf_counter()
+            self._fs = project.get_feature_store()
+            self.connect_seconds += time.perf_counter() - start
+        return self._fs
+
+    @property
+    def dataset_api(self):
+        if self._dataset_api is None:
+            project = self.project
+            start = time.perf_counter()
+            self._dataset_api = project.get_dataset_api()
+            self.connect_seconds += time.perf_counter() - start
+        return self._dataset_api
+
+    def run(self, fn):
+        try:
+            return fn(self)
+        except Exception as e:
+            if not _is_auth_error(e):
+                raise
+            print(f"Hopsworks session rejected ({e}); logging in again")
+            self.reset()
+            self.reconnects += 1
+            return fn(self)
+
+
+def _is_auth_error(error):
+    """True for HTTP 401/403 only (RestAPIError and requests errors carry the response)."""
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None) or getattr(error, "status_code", None)
+    return status in AUTH_ERROR_CODES
+
+
+# Lives as long as the function container; reused by warm invocations
+_CONNECTION = HopsworksConnection()
+_STATS = {"invocations": 0, "cold_ms": None, "warm_ms": []}
+WARM_SAMPLES = 100  # Warm latencies kept for /stats
+_TILE_ARCHIVES = {}  # day → (ZipFile in memory, loaded at)
+
+
+def _tile_archive(day):
+    """The tile archive of one horizon, downloaded at most once per TILE_ARCHIVE_TTL per container."""
+    cached = _TILE_ARCHIVES.get(day)
+    if cached is None or time.time() - cached[1] > TILE_ARCHIVE_TTL:
+        local_path = _CONNECTION.run(lambda c: c.dataset_api.download(
+            f"{TILE_ARCHIVE_DIR}/{day}d.zip", local_path=tempfile.gettempdir(), overwrite=True
+        ))
+        with open(local_path, 'rb') as f:
+            cached = _TILE_ARCHIVES[day] = (zipfile.ZipFile(io.BytesIO(f.read())), time.time())
+    return cached[0]
+
+
 def handler(event, context):
+    start = time.perf_counter()
+    cold = _STATS["invocations"] == 0
+    _STATS["invocations"] += 1
+    _CONNECTION.connect_seconds = 0.0
+
+    response = _route(event)
+
+    total_ms = (time.perf_counter() - start) * 1000
+    connect_ms = _CONNECTION.connect_seconds * 1000
+    if cold:
+        _STATS["cold_ms"] = round(total_ms, 1)
+    else:
+        _STATS["warm_ms"] = (_STATS["warm_ms"] + [round(total_ms, 1)])[-WARM_SAMPLES:]
+
+    response.setdefault("headers", {}).update({
+        "Server-Timing": f"connect;dur={connect_ms:.1f}, total;dur={total_ms:.1f}",
+        "X-Cold-Start": "1" if cold else "0",
+    })
+    print(json.dumps({
+        "cold_start": cold,
+        "invocation": _STATS["invocations"],
+        "connect_ms": round(connect_ms, 1),
+        "total_ms": round(total_ms, 1),
+        "status": response.get("statusCode"),
+    }))
+    return response
+
+
+def _latency_stats():
+    warm = sorted(_STATS["warm_ms"])
+    return {
+        "invocations": _STATS["invocations"],
+        "cold_start_ms": _STATS["cold_ms"],
+        "warm_p50_ms": warm[len(warm) // 2] if warm else None,
+        "warm_max_ms": warm[-1] if warm else None,
+        "logins": _CONNECTION.logins,
+        "reconnects": _CONNECTION.reconnects,
+        "connection_age_s": round(time.time() - _CONNECTION.connected_at) if _CONNECTION.connected_at else None,
+    }
+
+
+def _route(event):
     try:
         params = event.get("queryStringParameters", {}) or {}
-        
+
+        if params.get("type") == "stats":
+            # Cold-start vs warm latency of this function container
+            return {
+                "statusCode": 200,
+                "headers": {"Content-Type": "application/json", "Access-Control-Allow-Origin": "*"},
+                "body": json.dumps(_latency_stats())
+            }
+
         # Get API key from environment (set in Netlify)
-        api_key = os.environ.get("HOPSWORKS_API_KEY")
-        if not api_key:
+        if not os.environ.get("HOPSWORKS_API_KEY"):
             return {
                 "statusCode": 500,
                 "headers": {"Content-Type": "application/json"},
                 "body": json.dumps({"error": "HOPSWORKS_API_KEY not configured"})
             }
-        
-        # Connect to Hopsworks
-        project = hopsworks.login(api_key_value=api_key)
-        fs = project.get_feature_store()
-        
+
         if params.get("type") == "predictions":
             # Serve predictions from Hopsworks dataset storage (uploaded by batch job)
             try:
-                dataset_api = project.get_dataset_api()
-                
                 # Download predictions.json from Hopsworks
-                local_path = dataset_api.download("Resources/airquality/predictions.json", overwrite=True)
-                
+                local_path = _CONNECTION.run(
+                    lambda c: c.dataset_api.download("Resources/airquality/predictions.json", overwrite=True)
+                )
+
                 with open(local_path, 'r') as f:
                     predictions_data = json.load(f)
-                
+
                 return {
                     "statusCode": 200,
                     "headers": {
@@ -48,25 +209,22 @@ def handler(event, context):
                         "details": str(e)
                     })
                 }
-        
+
         if params.get("type") == "interpolation":
             # Serve interpolation heatmap images from Hopsworks
             day = params.get("day", "0")
             try:
-                dataset_api = project.get_dataset_api()
-                
                 # Pattern for interpolation files: forecast_interpolation_0d.png, forecast_interpolation_1d.png, etc.
                 filename = f"forecast_interpolation_{day}d.png"
                 file_path = f"Resources/airquality/{filename}"
-                
+
                 try:
                     # Try to download the specific file
-                    local_path = dataset_api.download(file_path, overwrite=True)
-                    
+                    local_path = _CONNECTION.run(lambda c: c.dataset_api.download(file_path, overwrite=True))
+
                     with open(local_path, 'rb') as img_file:
-                        import base64
                         img_data = base64.b64encode(img_file.read()).decode('utf-8')
-                    
+
                     return {
                         "statusCode": 200,
                         "headers": {
@@ -100,35 +258,108 @@ def handler(event, context):
                     },
                     "body": json.dumps({"error": "Failed to fetch interpolation", "details": str(e)})
                 }
-        
+
+        if params.get("type") == "tile":
+            # One map tile from the horizon's archive; tiles outside the pyramid are empty (204)
+            try:
+                day, z, x, y = (int(params[key]) for key in ("day", "z", "x", "y"))
+            except (KeyError, TypeError, ValueError):
+                return {
+                    "statusCode": 400,
+                    "headers": {"Content-Type": "application/json", "Access-Control-Allow-Origin": "*"},
+                    "body": json.dumps({"error": "type=tile needs integer day, z, x and y"})
+                }
+
+            try:
+                archive = _tile_archive(day)
+            except Exception as e:
+                return {
+                    "statusCode": 404,
+                    "headers": {"Content-Type": "application/json", "Access-Control-Allow-Origin": "*"},
+                    "body": json.dumps({"error": f"No map tiles for day {day}", "details": str(e)})
+                }
+
+            name = f"{z}/{x}/{y}.png"
+            if name not in archive.NameToInfo:
+                return {
+                    "statusCode": 204,
+                    "headers": {"Access-Control-Allow-Origin": "*", "Cache-Control": "public, max-age=600"},
+                    "body": ""
+                }
+            return {
+                "statusCode": 200,
+                "headers": {
+                    "Content-Type": "image/png",
+                    "Access-Control-Allow-Origin": "*",
+                    "Cache-Control": "public, max-age=600"
+                },
+                "body": base64.b64encode(archive.read(name)).decode('utf-8'),
+                "isBase64Encoded": True
+            }
+
+        if params.get("type") == "models":
+            # Serve the model manifest published by the training pipeline
+            # (sensor_id → model name, version, feature set, feature order, checksum)
+            try:
+                local_path = _CONNECTION.run(
+                    lambda c: c.dataset_api.download("Resources/models/model_manifest.json", overwrite=True)
+                )
+
+                with open(local_path, 'r') as f:
+                    manifest = json.load(f)
+
+                return {
+                    "statusCode": 200,
+                    "headers": {
+                        "Content-Type": "application/json",
+                        "Access-Control-Allow-Origin": "*",
+                        "Cache-Control": "public, max-age=300"
+                    },
+                    "body": json.dumps(manifest)
+                }
+            except Exception as e:
+                return {
+                    "statusCode": 404,
+                    "headers": {"Content-Type": "application/json"},
+                    "body": json.dumps({
+                        "error": "Model manifest not found in Hopsworks storage",
+                        "details": str(e)
+                    })
+                }
+
         if "sensor" in params:
             sensor_id = int(params["sensor"])
-            try:
+
+            def read_sensor(c):
                 # Fetch sensor-specific data
-                monitor_fg = fs.get_feature_group("aq_predictions", version=1)
-                air_quality_fg = fs.get_feature_group("air_quality", version=1)
-                
+                monitor_fg = c.fs.get_feature_group("aq_predictions", version=1)
+                air_quality_fg = c.fs.get_feature_group("air_quality", version=1)
+
                 # Get predictions for this sensor
                 sensor_predictions = monitor_fg.filter(
-                    (monitor_fg.sensor_id == sensor_id) & 
+                    (monitor_fg.sensor_id == sensor_id) &
                     (monitor_fg.days_before_forecast_day == 1)
                 ).read()
-                
+
                 # Get historical data for this sensor
                 sensor_history = air_quality_fg.filter(
                     air_quality_fg.sensor_id == sensor_id
                 ).read()
-                
+                return sensor_predictions, sensor_history
+
+            try:
+                sensor_predictions, sensor_history = _CONNECTION.run(read_sensor)
+
                 # Combine and format
                 sensor_predictions["date"] = sensor_predictions["date"].astype(str)
                 sensor_history["date"] = sensor_history["date"].astype(str)
-                
+
                 sensor_data = {
                     "sensor_id": sensor_id,
                     "predictions": sensor_predictions.to_dict(orient="records"),
                     "history": sensor_history.to_dict(orient="records")
                 }
-                
+
                 return {
                     "statusCode": 200,
                     "headers": {
@@ -146,16 +377,16 @@ def handler(event, context):
                         "details": str(e)
                     })
                 }
-        
+
         return {
             "statusCode": 400,
             "headers": {"Content-Type": "application/json"},
-            "body": json.dumps({"error": "Invalid request. Use ?type=predictions or ?sensor=<id>"})
+            "body": json.dumps({"error": "Invalid request. Use ?type=predictions, ?type=models, ?type=tile, ?type=stats or ?sensor=<id>"})
         }
-    
+
     except Exception as e:
         return {
             "statusCode": 500,
             "headers": {"Content-Type": "application/json"},
             "body": json.dumps({"error": str(e)})
-        }
\ No newline at end of file
+        }
@@ -0,0 +1,196 @@
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+
+# AQI bands drawn behind every forecast plot (same as visualization.plot_air_quality_forecast)
+BAND_COLORS = ['green', 'yellow', 'orange', 'red', 'purple', 'darkred']
+BAND_LABELS = ['Good', 'Moderate', 'Unhealthy for Some', 'Unhealthy', 'Very Unhealthy', 'Hazardous']
+BAND_RANGES = [(0, 49), (50, 99), (100, 149), (150, 199), (200, 299), (300, 500)]
+
+PLOT_COLUMNS = ["date", "predicted_pm25", "pm25"]  # Only these are sent to the workers
+JOBS_PER_CHUNK = 8                                 # Plots rendered per task
+
+# Worker-local templates, built on first use in each process
+_TEMPLATES = {}
+
+
+class ForecastPlotTemplate:
+    """
+    One Agg figure with the static parts of plot_air_quality_forecast (log
+    axis, AQI bands, category legend) set up once and laid out on the first
+    render. render() only swaps the line data, x locator, limits and title,
+    then saves.
+    """
+
+    def __init__(self, hindcast=False):
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        from matplotlib.patches import Patch
+        from matplotlib.ticker import ScalarFormatter
+
+        self.hindcast = hindcast
+        self.fig = Figure(figsize=(10, 6))
+        FigureCanvasAgg(self.fig)
+        ax = self.ax = self.fig.add_subplot()
+
+        # Plot placeholder dates first so the axis gets matplotlib's date units
+        placeholder = pd.date_range("2000-01-01", periods=2).date
+        self.predicted, = ax.plot(
+            placeholder, [1, 1], label='Predicted PM2.5', color='red', linewidth=2,
+            marker='o', markersize=5, markerfacecolor='blue',
+        )
+
+        ax.set_yscale('log')
+        ax.set_yticks([0, 10, 25, 50, 100, 250, 500])
+        ax.get_yaxis().set_major_formatter(ScalarFormatter())
+        ax.set_xlabel('Date')
+        ax.set_ylabel('PM2.5')
+        for color, (start, end) in zip(BAND_COLORS, BAND_RANGES):
+            ax.axhspan(start, end, color=color, alpha=0.3)
+
+        patches = [Patch(color=c, label=f"{l}: {r[0]}-{r[1]}") for c, l, r in zip(BAND_COLORS, BAND_LABELS, BAND_RANGES)]
+        legend = ax.legend(handles=patches, loc='upper right', title="Air Quality Categories", fontsize='x-small')
+
+        if hindcast:
+            self.actual, = ax.plot(
+                placeholder, [1, 1], label='Actual PM2.5', color='black', linewidth=2,
+                marker='^', markersize=5, markerfacecolor='grey',
+            )
+            ax.legend(loc='upper left', fontsize='x-small')
+            ax.add_artist(legend)
+
+        ax.tick_params(axis='x', labelrotation=45)
+        self.default_locator = ax.xaxis.get_major_locator()
+        self.title = ax.set_title("")
+        self.laid_out = False
+
+    @staticmethod
+    def _y_top(predicted):
+        """
+        Upper y limit plot_air_quality_forecast ends up with: the predicted
+        line autoscaled on the log axis (5% margin), widened to the 500 tick.
+        """
+        positive = predicted[np.isfinite(predicted) & (predicted > 0)]
+        if len(positive) == 0:
+            return 500
+        low, high = np.log10(positive.min()), np.log10(positive.max())
+        return max(500, 10 ** (high + 0.05 * (high - low)))
+
+    def render(self, city, street, df, file_path):
+        from matplotlib.ticker import MultipleLocator
+
+        ax = self.ax
+        day = pd.to_datetime(df['date']).dt.date.to_numpy()
+        self.predicted.set_data(day, df['predicted_pm25'].to_numpy(dtype=float))
+        if self.hindcast:
+            self.actual.set_data(day, df['pm25'].to_numpy(dtype=float))
+
+        # Aim for ~10 annotated values on x-axis, as in plot_air_quality_forecast
+        if len(df.index) > 11:
+            ax.xaxis.set_major_locator(MultipleLocator(len(df.index) / 10))
+        else:
+            ax.xaxis.set_major_locator(self.default_locator)
+
+        ax.relim()
+        ax.autoscale_view(scaley=False)
+        ax.set_ylim(1, self._y_top(df['predicted_pm25'].to_numpy(dtype=float)))
+        self.title.set_text(f"PM2.5 Predicted (Logarithmic Scale) for {city}, {street}")
+        if not self.laid_out:
+            # Laid out once with real date labels; they have the same width for every sensor
+            self.fig.tight_layout()
+            self.laid_out = True
+        self.fig.savefig(file_path)
+
+
+class ImportancePlotTemplate:
+    """One reused Agg figure for xgboost.plot_importance, cleared between models."""
+
+    def __init__(self):
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        self.fig = Figure()  # plt.figure() defaults, as plot_importance without ax
+        FigureCanvasAgg(self.fig)
+        self.ax = self.fig.add_subplot()
+
+    def render(self, scores, file_path):
+        from xgboost import plot_importance
+
+        self.ax.cla()
+        plot_importance(scores, ax=self.ax)
+        self.fig.savefig(file_path)
+
+
+def _template(kind):
+    if kind not in _TEMPLATES:
+        _TEMPLATES[kind] = ImportancePlotTemplate() if kind == "importance" else ForecastPlotTemplate(kind == "hindcast")
+    return _TEMPLATES[kind]
+
+
+def _render_chunk(jobs):
+    """Render a list of jobs in this process; returns [(file_path, error message or None)]."""
+    results = []
+    for job in jobs:
+        try:
+            if job["kind"] == "importance":
+                _template("importance").render(job["scores"], job["file_path"])
+            else:
+                _template(job["kind"]).render(job["city"], job["street"], job["df"], job["file_path"])
+            results.append((job["file_path"], None))
+        except Exception as e:
+            results.append((job["file_path"], f"{type(e).__name__}: {e}"))
+    return results
+
+
+def forecast_job(city, street, df, file_path, hindcast=False):
+    """A forecast/hindcast plot job with the same arguments as plot_air_quality_forecast."""
+    columns = [c for c in PLOT_COLUMNS if c in df.columns]
+    return {
+        "kind": "hindcast" if hindcast else "forecast",
+        "city": city,
+        "street": street,
+        "df": df[columns].reset_index(drop=True),
+        "file_path": str(file_path),
+    }
+
+
+def importance_job(model, file_path):
+    """A feature-importance plot job; only the model's weight scores are sent to the worker."""
+    booster = model.get_booster() if hasattr(model, "get_booster") else model
+    return {"kind": "importance", "scores": booster.get_score(importance_type="weight"), "file_path": str(file_path)}
+
+
+def render_plots(jobs, max_workers=None, chunk_size=JOBS_PER_CHUNK):
+    """
+    Render plot jobs (forecast_job / importance_job) across a process pool.
+
+    Each worker draws through Agg figures it builds once per plot kind, so
+    nothing touches pyplot or the notebook's backend. Jobs are sent in
+    chunks of chunk_size. Returns {file_path: error message or None}.
+    """
+    start = time.perf_counter()
+    chunks = [jobs[i:i + chunk_size] for i in range(0, len(jobs), chunk_size)]
+    max_workers = max(1, min(max_workers or os.cpu_count() or 1, len(chunks) or 1))
+
+    results = {}
+    if max_workers == 1:
+        for chunk in chunks:
+            results.update(_render_chunk(chunk))
+    else:
+        # Spawn so workers start from a clean matplotlib state rather than the notebook's
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as pool:
+            for future in as_completed([pool.submit(_render_chunk, chunk) for chunk in chunks]):
+                results.update(future.result())
+
+    failed = sum(error is not None for error in results.values())
+    print(
+        f"🖼️ Rendered {len(results) - failed}/{len(results)} plots with {max_workers} workers "
+        f"in {time.perf_counter() - start:.1f}s"
+    )
+    return results
@@ -0,0 +1,322 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils import backtest, inference, packed_forest, training, training_data
+
+
+HORIZONS = backtest.HORIZONS
+HORIZON_FEATURE = "days_ahead"  # Lead time of the target day relative to the issue day
+
+BUNDLE_FILE = "direct_model_bundle.bin"
+REMOTE_PATH = f"Resources/models/{BUNDLE_FILE}"
+
+
+def weather_columns(frame, target=training.TARGET):
+    """Model inputs other than the PM2.5-derived features."""
+    return [c for c in training.feature_columns(frame) if c not in training_data.AQ_FEATURES and c != target]
+
+
+def feature_names(weather_cols):
+    return training_data.AQ_FEATURES + list(weather_cols) + [HORIZON_FEATURE]
+
+
+def issue_features(observed, issue_idx, neighbours):
+    """AQ features known on each issue day: {name: array[issue, sensor]}"""
+    lags = np.stack([observed[:, issue_idx - k - 1].T for k in range(inference.MAX_LAG)])
+    return inference.aq_features(lags, neighbours)
+
+
+def design_matrix(names, aq, arrays, issue_idx, horizons, s):
+    """
+    Rows for sensor position s, ordered (horizon, issue): the issue-day AQ
+    features, the target day's weather and the horizon itself.
+    """
+    day_idx = issue_idx[None, :] + np.arange(horizons)[:, None]
+    columns = []
+    for name in names:
+        if name == HORIZON_FEATURE:
+            columns.append(np.repeat(np.arange(horizons, dtype=float), len(issue_idx)))
+        elif name in aq:
+            columns.append(np.tile(aq[name][:, s], horizons))
+        else:
+            columns.append(arrays[name][s, day_idx].ravel())
+    return np.column_stack(columns)
+
+
+def train_direct_models(
+    frame,
+    sensor_locations,
+    xgb_params,
+    horizons=HORIZONS,
+    train_ratio=training.TRAIN_RATIO,
+    min_rows=training.MIN_ROWS,
+    n_restarts=1,
+    n_closest=inference.N_CLOSEST,
+    target=training.TARGET,
+):
+    """
+    Train one model per sensor that predicts every horizon directly.
+
+    Each training row is (issue day, horizon): the AQ features known on the
+    issue day, the weather on the target day and the horizon, labelled with
+    the PM2.5 observed `horizon` days after the issue day. Rows are split in
+    time: train on targets up to the split date, evaluate on issues after it.
+
+    Returns (models, results): sensor_id → XGBRegressor and one result row
+    per sensor (R2, MSE, sizes, last_train_date).
+    """
+    start = time.perf_counter()
+    weather_cols = weather_columns(frame, target)
+    names = feature_names(weather_cols)
+    sensor_ids, dates, arrays = inference.dense_panel(frame, [target] + weather_cols)
+    observed = arrays[target]
+    neighbours = inference.neighbour_index(sensor_ids, sensor_locations, n_closest)
+
+    issue_idx = np.arange(inference.MAX_LAG, len(dates) - horizons + 1)
+    aq = issue_features(observed, issue_idx, neighbours)
+    issue_of_row = np.tile(issue_idx, horizons)
+    target_of_row = (issue_idx[None, :] + np.arange(horizons)[:, None]).ravel()
+
+    models, results = {}, []
+    for s, sensor_id in enumerate(sensor_ids):
+        y = observed[s, target_of_row]
+        labelled = ~np.isnan(y)
+        if labelled.sum() < min_rows:
+            continue
+
+        # Split on the target day so no evaluation issue sees a training label
+        split_idx = np.quantile(target_of_row[labelled], train_ratio, method="lower")
+        train_rows = labelled & (target_of_row <= split_idx)
+        test_rows = labelled & (issue_of_row > split_idx)
+        if train_rows.sum() < min_rows or test_rows.sum() < training.MIN_TEST_ROWS:
+            continue
+
+        X = pd.DataFrame(design_matrix(names, aq, arrays, issue_idx, horizons, s), columns=names)
+        X[target] = y
+        dtrain, dtest = training.build_dmatrices(X[train_rows], X[test_rows], names, target)
+        model, _, r2, mse, _ = training.fit_best_of_n(dtrain, dtest, xgb_params, n_restarts=n_restarts)
+
+        models[int(sensor_id)] = model
+        results.append({
+            "sensor_id": int(sensor_id),
+            "R2": r2,
+            "MSE": mse,
+            "train_size": int(train_rows.sum()),
+            "test_size": int(test_rows.sum()),
+            "last_train_date": dates[split_idx],
+        })
+
+    print(
+        f"✅ Trained {len(models)} direct models ({horizons} horizons each) "
+        f"in {time.perf_counter() - start:.1f}s"
+    )
+    return models, pd.DataFrame(results)
+
+
+def run_direct_backtest(
+    frame,
+    models,
+    sensor_locations,
+    issue_dates=None,
+    horizons=HORIZONS,
+    last_train_dates=None,
+    n_closest=inference.N_CLOSEST,
+    target=training.TARGET,
+):
+    """
+    backtest.run_backtest for direct models: every horizon of every issue
+    date is predicted in one call per sensor, with no feedback between days.
+    Returns (scores, forecasts) in the same shape.
+    """
+    start = time.perf_counter()
+    weather_cols = weather_columns(frame, target)
+    sensor_ids, dates, arrays = inference.dense_panel(frame, [target] + weather_cols)
+    observed = arrays[target]
+
+    if issue_dates is None:
+        issue_idx = np.arange(inference.MAX_LAG, len(dates) - horizons + 1)
+    else:
+        issue_idx = dates.get_indexer(pd.to_datetime(pd.Index(issue_dates)))
+        issue_idx = issue_idx[(issue_idx >= inference.MAX_LAG) & (issue_idx + horizons <= len(dates))]
+    if len(issue_idx) == 0:
+        raise ValueError("No issue dates with enough history and horizon inside the frame")
+
+    neighbours = inference.neighbour_index(sensor_ids, sensor_locations, n_closest)
+    aq = issue_features(observed, issue_idx, neighbours)
+    predicted = np.full((horizons, len(issue_idx), len(sensor_ids)), np.nan)
+
+    model_sensors = [(s, models[int(sid)]) for s, sid in enumerate(sensor_ids) if int(sid) in models]
+    for s, model in model_sensors:
+        X = design_matrix(model.get_booster().feature_names, aq, arrays, issue_idx, horizons, s)
+        predicted[:, :, s] = model.get_booster().inplace_predict(X).reshape(horizons, len(issue_idx))
+
+    horizon_grid, issue_grid, sensor_grid = np.meshgrid(
+        np.arange(horizons), np.arange(len(issue_idx)), np.arange(len(sensor_ids)), indexing="ij"
+    )
+    forecasts = pd.DataFrame({
+        "issue_date": dates[issue_idx[issue_grid.ravel()]],
+        "date": dates[issue_idx[issue_grid.ravel()] + horizon_grid.ravel()],
+        "sensor_id": sensor_ids[sensor_grid.ravel()],
+        "days_before_forecast_day": horizon_grid.ravel(),
+        "predicted_pm25": predicted.ravel(),
+        target: observed[sensor_grid.ravel(), issue_idx[issue_grid.ravel()] + horizon_grid.ravel()],
+    })
+    forecasts = forecasts.dropna(subset=["predicted_pm25", target])
+
+    if last_train_dates is not None:
+        cutoff = forecasts["sensor_id"].map({int(k): pd.Timestamp(v) for k, v in last_train_dates.items()})
+        forecasts = forecasts[forecasts["issue_date"] > cutoff]
+
+    scores = backtest.score_by_horizon(forecasts, target=target)
+    print(
+        f"✅ Direct backtest: {len(issue_idx)} issue dates × {len(model_sensors)} sensors × {horizons} horizons "
+        f"({len(forecasts):,} scored forecasts) in {time.perf_counter() - start:.1f}s"
+    )
+    return scores, forecasts.reset_index(drop=True)
+
+
+def compare_strategies(
+    frame,
+    recursive_models,
+    direct_models,
+    sensor_locations,
+    issue_dates=None,
+    last_train_dates=None,
+    horizons=HORIZONS,
+    target=training.TARGET,
+):
+    """
+    Backtest both strategies on the same issue dates, sensors and targets.
+
+    Only (issue date, sensor, horizon) cells scored by both are compared, so
+    the MAE/RMSE columns are like for like. Returns a DataFrame per
+    days_before_forecast_day with both strategies' errors and the wall time
+    of each backtest in .attrs["seconds"].
+    """
+    start = time.perf_counter()
+    _, recursive = backtest.run_backtest(
+        frame, recursive_models, sensor_locations, issue_dates, horizons, last_train_dates, target=target
+    )
+    recursive_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    _, direct = run_direct_backtest(
+        frame, direct_models, sensor_locations, issue_dates, horizons, last_train_dates, target=target
+    )
+    direct_seconds = time.perf_counter() - start
+
+    keys = ["issue_date", "sensor_id", "days_before_forecast_day"]
+    both = recursive.merge(direct[keys + ["predicted_pm25"]], on=keys, suffixes=("_recursive", "_direct"))
+    comparison = pd.concat(
+        {
+            strategy: backtest.score_by_horizon(
+                both.rename(columns={f"predicted_pm25_{strategy}": "predicted_pm25"}), target=target
+            )[["MAE", "RMSE"]]
+            for strategy in ("recursive", "direct")
+        },
+        axis=1,
+    )
+    comparison["n"] = both.groupby("days_before_forecast_day").size()
+    comparison.attrs["seconds"] = {"recursive": recursive_seconds, "direct": direct_seconds}
+
+    print(
+        f"📊 Recursive vs direct on {len(both):,} shared forecasts: "
+        f"MAE {comparison[('recursive', 'MAE')].mean():.2f} vs {comparison[('direct', 'MAE')].mean():.2f}, "
+        f"{recursive_seconds:.2f}s vs {direct_seconds:.2f}s"
+    )
+    return comparison
+
+
+def run_direct_forecast(
+    batch_data,
+    models,
+    sensor_locations,
+    forecast_days,
+    today,
+    packed=None,
+    n_closest=inference.N_CLOSEST,
+    target=training.TARGET,
+):
+    """
+    Forecast every day with direct models, all horizons in one batch.
+
+    The first forecast day is the issue day: its AQ features come from the
+    observations before it and each later day only adds its own weather and
+    horizon, so no prediction waits for another. With packed
+    (packed_forest.pack_models(models)) all sensors and horizons go through
+    one traversal and models is not touched (it can be a lazy ModelBundle);
+    otherwise each sensor predicts its horizons in one call.
+
+    Returns (predictions, batch_data) like inference.run_forecast; the
+    predicted_<feature> columns are the lag/rolling/nearby values implied by
+    the forecast series.
+    """
+    start = time.perf_counter()
+    forecast_days = sorted({pd.Timestamp(d) for d in forecast_days})
+    today = pd.Timestamp(today)
+
+    if packed is not None:
+        columns = {target, *packed["columns"]} - {HORIZON_FEATURE}
+        with_model = set(packed["sensor_ids"])
+    else:
+        columns = {target}.union(*(m.get_booster().feature_names for m in models.values())) - {HORIZON_FEATURE}
+        with_model = {int(sid) for sid in models}
+    dates = pd.date_range(
+        min(batch_data["date"].min(), forecast_days[0] - pd.Timedelta(days=inference.MAX_LAG)),
+        forecast_days[-1],
+        freq="D",
+    )
+    sensor_ids, dates, arrays = inference.dense_panel(batch_data, sorted(columns), dates=dates)
+    present = inference.dense_panel(batch_data.assign(_present=1.0), ["_present"], dates=dates)[2]["_present"] == 1
+    pm25 = arrays[target]
+    neighbours = inference.neighbour_index(sensor_ids, sensor_locations, n_closest)
+
+    issue = np.array([dates.get_loc(forecast_days[0])])
+    horizons = (forecast_days[-1] - forecast_days[0]).days + 1
+    aq = issue_features(pm25, issue, neighbours)
+    predicted = np.full((len(sensor_ids), len(dates)), np.nan)
+
+    model_sensors = [(s, int(sid)) for s, sid in enumerate(sensor_ids) if int(sid) in with_model]
+    if packed is not None:
+        names = packed["columns"]
+        X = np.concatenate([design_matrix(names, aq, arrays, issue, horizons, s) for s, _ in model_sensors])
+        rows = np.repeat([sid for _, sid in model_sensors], horizons)
+        values = packed_forest.predict_packed(packed, X, rows).reshape(len(model_sensors), horizons)
+        for (s, _), row in zip(model_sensors, values):
+            predicted[s, issue[0]:issue[0] + horizons] = row
+    else:
+        for s, sid in model_sensors:
+            model = models[sid] if sid in models else models[str(sid)]
+            X = design_matrix(model.get_booster().feature_names, aq, arrays, issue, horizons, s)
+            predicted[s, issue[0]:issue[0] + horizons] = model.get_booster().inplace_predict(X)
+
+    # Same outputs as the recursive path: the series with predictions filling the gaps,
+    # and the lag / rolling / nearby values it implies for each forecast day
+    predicted[~present] = np.nan
+    series = np.where(np.isnan(pm25), predicted, pm25)
+    frames = []
+    for day in forecast_days:
+        t = dates.get_loc(day)
+        done = ~np.isnan(predicted[:, t])
+        lags = np.stack([series[:, t - k - 1] for k in range(inference.MAX_LAG)])
+        features = inference.aq_features(lags, neighbours)
+        frame = pd.DataFrame({
+            "date": day,
+            "sensor_id": sensor_ids[done],
+            "predicted_pm25": predicted[done, t],
+            "days_before_forecast_day": float((day - today).days),
+        })
+        for col in training_data.AQ_FEATURES:
+            frame[f"predicted_{col}"] = features[col][done]
+        frames.append(frame)
+
+    predictions = pd.concat(frames, ignore_index=True)
+    predictions["sensor_id"] = predictions["sensor_id"].astype(batch_data["sensor_id"].dtype)
+
+    print(
+        f"✅ Direct forecast {len(predictions)} rows for {predictions['sensor_id'].nunique()} sensors × "
+        f"{len(forecast_days)} days in {time.perf_counter() - start:.2f}s"
+    )
+    return predictions, inference.fill_forecast(batch_data, predictions, target)
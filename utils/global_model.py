@@ -0,0 +1,191 @@
+import json
+from collections.abc import Mapping
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import mean_squared_error, r2_score
+from xgboost import XGBRegressor
+
+from utils import training, training_data
+
+
+GLOBAL_MODEL_NAME = "air_quality_xgboost_model_global"
+STATE_FILE = "global_model_state.json"
+
+SENSOR_CATEGORY = "sensor_category"
+SENSOR_TARGET_MEAN = "sensor_target_mean"
+
+# Pseudo-count pulling sparse sensors' target encoding towards the network mean
+TARGET_ENCODING_SMOOTHING = 10
+
+
+def sensor_coordinates(sensor_locations):
+    """
+    Return DataFrame indexed by sensor_id with latitude/longitude.
+
+    Accepts both location formats used by the pipelines: sensor_id → tuple
+    (latitude, longitude, ...) or sensor_id → {"latitude": ..., "longitude": ...}.
+    """
+    rows = []
+    for sid, loc in sensor_locations.items():
+        if isinstance(loc, Mapping):
+            lat, lon = loc["latitude"], loc["longitude"]
+        else:
+            lat, lon = loc[0], loc[1]
+        rows.append({"sensor_id": int(sid), "latitude": float(lat), "longitude": float(lon)})
+    return pd.DataFrame(rows).set_index("sensor_id")
+
+
+def fit_target_encoding(train_df, target=training.TARGET, smoothing=TARGET_ENCODING_SMOOTHING):
+    """Return dict: sensor_id → smoothed mean target over the training rows"""
+    global_mean = train_df[target].mean()
+    stats = train_df.groupby("sensor_id")[target].agg(["sum", "count"])
+    encoded = (stats["sum"] + smoothing * global_mean) / (stats["count"] + smoothing)
+    return {int(sid): float(v) for sid, v in encoded.items()}, float(global_mean)
+
+
+def add_sensor_features(df, state, coordinates):
+    """
+    Add the sensor-level features described by state to a pooled frame:
+    coordinates plus either a categorical sensor id or its target encoding.
+    """
+    df = df.copy()
+    sensor_ids = df["sensor_id"].astype(int)
+    df["latitude"] = sensor_ids.map(coordinates["latitude"]).to_numpy()
+    df["longitude"] = sensor_ids.map(coordinates["longitude"]).to_numpy()
+
+    if state["encoding"] == "categorical":
+        df[SENSOR_CATEGORY] = pd.Categorical(sensor_ids, categories=state["categories"])
+    else:
+        means = {int(k): v for k, v in state["target_means"].items()}
+        df[SENSOR_TARGET_MEAN] = sensor_ids.map(means).fillna(state["global_mean"]).to_numpy()
+
+    return df
+
+
+def _split(training_frame, train_ratio, min_rows, min_test_rows, target):
+    """Per-sensor time-ordered split, identical to the per-sensor training tasks."""
+    train_parts, test_parts = [], []
+    for sensor_id, df in training.partition_by_sensor(training_frame, target=target).items():
+        if len(df) < min_rows:
+            continue
+        train_size = int(train_ratio * len(df))
+        if len(df) - train_size < min_test_rows:
+            continue
+        train_parts.append(df.iloc[:train_size])
+        test_parts.append(df.iloc[train_size:])
+    return pd.concat(train_parts, ignore_index=True), pd.concat(test_parts, ignore_index=True)
+
+
+def train_global_model(
+    training_frame,
+    sensor_locations,
+    xgb_params,
+    feature_name="complete",
+    encoding="categorical",
+    train_ratio=training.TRAIN_RATIO,
+    min_rows=training.MIN_ROWS,
+    min_test_rows=training.MIN_TEST_ROWS,
+    target=training.TARGET,
+    n_jobs=None,
+):
+    """
+    Train one pooled model for all sensors.
+
+    encoding is "categorical" (native XGBoost categorical sensor id) or
+    "target" (smoothed per-sensor target mean from the training rows).
+    Returns (model, state, test_df) where test_df holds `predicted_pm25` for
+    the same held-out rows the per-sensor models are scored on.
+    """
+    if encoding not in ("categorical", "target"):
+        raise ValueError("encoding must be 'categorical' or 'target'")
+
+    frame = training_data.project_feature_set(training_frame, feature_name)
+    train_df, test_df = _split(frame, train_ratio, min_rows, min_test_rows, target)
+    coordinates = sensor_coordinates(sensor_locations)
+
+    state = {"encoding": encoding, "feature_name": feature_name}
+    if encoding == "categorical":
+        state["categories"] = sorted(int(s) for s in train_df["sensor_id"].unique())
+    else:
+        state["target_means"], state["global_mean"] = fit_target_encoding(train_df, target)
+
+    train_df = add_sensor_features(train_df, state, coordinates)
+    test_df = add_sensor_features(test_df, state, coordinates)
+    feature_cols = training.feature_columns(train_df, [c for c in training.EXCLUDE_COLS if c not in ("latitude", "longitude")])
+    state["feature_names"] = feature_cols
+
+    model = XGBRegressor(
+        n_estimators=xgb_params["n_estimators"],
+        learning_rate=xgb_params["learning_rate"],
+        tree_method="hist",
+        enable_categorical=encoding == "categorical",
+        n_jobs=n_jobs,
+    )
+    model.fit(train_df[feature_cols], train_df[target])
+
+    test_df["predicted_pm25"] = model.predict(test_df[feature_cols])
+    print(f"✅ Trained global model on {len(train_df):,} rows from {train_df['sensor_id'].nunique()} sensors ({encoding} sensor encoding)")
+
+    return model, state, test_df
+
+
+def predict_global(model, state, df, sensor_locations):
+    """One batched predict for every row in df (any number of sensors)."""
+    features = add_sensor_features(df, state, sensor_coordinates(sensor_locations))
+    return model.predict(features[state["feature_names"]])
+
+
+def compare_with_per_sensor(test_df, best_models, models, target=training.TARGET):
+    """
+    Per-sensor accuracy of the global model next to the per-sensor model
+    training registers for each sensor.
+
+    best_models is the selection table the registration step uses (indexed
+    by sensor_id, with feature_name) and models is feature_name → sensor_id
+    → model. Both models are scored on the same rows of test_df, the global
+    model's held-out rows, instead of reusing the selection's own R2.
+    """
+    rows = []
+    for sensor_id, g in test_df.groupby("sensor_id"):
+        if sensor_id not in best_models.index:
+            continue
+        feature_name = best_models.loc[sensor_id, "feature_name"]
+        model = models[feature_name][sensor_id]
+        per_sensor_pred = model.predict(g.reindex(columns=model.get_booster().feature_names))
+        rows.append({
+            "sensor_id": sensor_id,
+            "per_sensor_feature_name": feature_name,
+            "per_sensor_R2": r2_score(g[target], per_sensor_pred),
+            "per_sensor_MSE": mean_squared_error(g[target], per_sensor_pred),
+            "global_R2": r2_score(g[target], g["predicted_pm25"]),
+            "global_MSE": mean_squared_error(g[target], g["predicted_pm25"]),
+        })
+    comparison = pd.DataFrame(rows)
+
+    comparison["delta_R2"] = comparison["global_R2"] - comparison["per_sensor_R2"]
+    comparison["winner"] = np.where(comparison["delta_R2"] >= 0, "global", "per_sensor")
+
+    print(
+        f"📊 Global model wins on {(comparison['winner'] == 'global').sum()}/{len(comparison)} sensors "
+        f"(median ΔR² {comparison['delta_R2'].median():+.3f}, "
+        f"mean MSE {comparison['global_MSE'].mean():.2f} vs {comparison['per_sensor_MSE'].mean():.2f})"
+    )
+    return comparison
+
+
+def save_global_model(model, model_dir, state):
+    model_dir = Path(model_dir)
+    model_dir.mkdir(parents=True, exist_ok=True)
+    model.save_model(model_dir / "model.json")
+    with open(model_dir / STATE_FILE, "w") as f:
+        json.dump(state, f, indent=2)
+
+
+def load_global_model(model_dir):
+    model = XGBRegressor()
+    model.load_model(f"{model_dir}/model.json")
+    with open(Path(model_dir) / STATE_FILE) as f:
+        state = json.load(f)
+    return model, state
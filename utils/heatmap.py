@@ -0,0 +1,172 @@
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+
+AQI_COLORS = [
+    "#00e400", "#7de400", "#ffff00", "#ffb000",
+    "#ff7e00", "#ff4000", "#ff0000", "#c0007f",
+    "#8f3f97", "#7e0023",
+]
+LUT_SIZE = 256        # Colormap entries
+OVERLAY_ALPHA = 0.65  # Opacity of the coloured overlay
+VMAX_FLOOR = 500      # Upper end of the colour scale is at least this (PM2.5)
+PNG_COMPRESS_LEVEL = 3  # zlib level; higher is smaller but slower
+PARITY_P99 = 8        # Max 99th-percentile channel difference from the matplotlib render
+
+
+def _hex_rgb(color):
+    color = color.lstrip("#")
+    return [int(color[i:i + 2], 16) for i in (0, 2, 4)]
+
+
+def aqi_lut(colors=AQI_COLORS, size=LUT_SIZE, alpha=OVERLAY_ALPHA):
+    """
+    uint8 RGBA table[size + 1, 4] of the AQI colormap: the colors linearly
+    blended at evenly spaced stops, as LinearSegmentedColormap.from_list
+    does. The last entry is transparent and used for NaN.
+    """
+    stops = np.linspace(0, 1, len(colors))
+    rgb = np.array([_hex_rgb(c) for c in colors], dtype=np.float64)
+    x = np.linspace(0, 1, size)
+    lut = np.zeros((size + 1, 4), dtype=np.uint8)
+    for channel in range(3):
+        lut[:size, channel] = np.round(np.interp(x, stops, rgb[:, channel]))
+    lut[:size, 3] = round(alpha * 255)
+    return lut
+
+
+_LUT = aqi_lut()
+
+
+def color_range(grid):
+    """(vmin, vmax) used to colour a grid: from max(0, min) to at least VMAX_FLOOR."""
+    return max(0.0, float(np.nanmin(grid))), max(float(np.nanmax(grid)), VMAX_FLOOR)
+
+
+def lookup(values, vmin, vmax, lut=_LUT):
+    """RGBA uint8 array[..., 4] for values scaled between vmin and vmax; NaN is transparent."""
+    size = len(lut) - 1
+    scaled = (np.asarray(values, dtype=np.float32) - vmin) * ((size - 1) / max(vmax - vmin, 1e-12)) + 0.5  # nearest entry
+    np.clip(scaled, 0, size - 1, out=scaled)
+    scaled[np.isnan(scaled)] = size
+    return lut[scaled.astype(np.intp)]
+
+
+def colorize(grid, vmin=None, vmax=None, lut=_LUT):
+    """
+    Map a grid (row 0 = southernmost latitude, as the interpolators return
+    it) to an RGBA uint8 image[res, res, 4] with north up. NaN cells are
+    transparent.
+    """
+    grid = np.asarray(grid, dtype=np.float32)
+    if vmin is None or vmax is None:
+        vmin, vmax = color_range(grid)
+    return lookup(grid[::-1], vmin, vmax, lut)
+
+
+def write_png(rgba, path, compress_level=PNG_COMPRESS_LEVEL):
+    """Write an RGBA uint8 array as a PNG (atomically, so readers never see half a file)."""
+    tmp = f"{path}.tmp"
+    Image.fromarray(rgba, "RGBA").save(tmp, format="PNG", compress_level=compress_level)
+    os.replace(tmp, path)
+    return path
+
+
+def render_heatmap(grid, path, compress_level=PNG_COMPRESS_LEVEL):
+    """Save one interpolated grid as a transparent AQI-coloured PNG, one pixel per grid cell."""
+    if np.isnan(grid).all():
+        raise ValueError("No valid sensor data for this grid")
+    return write_png(colorize(grid), path, compress_level)
+
+
+def render_heatmaps(grids, paths, max_workers=None, compress_level=PNG_COMPRESS_LEVEL):
+    """
+    Render grids[i] to paths[i] in parallel threads (the lookup and zlib
+    release the GIL). Returns {path: None or the exception it raised}.
+    """
+    def render(grid, path):
+        try:
+            render_heatmap(grid, path, compress_level)
+            return None
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=max_workers or min(len(paths), os.cpu_count() or 1) or 1) as pool:
+        return dict(zip(paths, pool.map(render, grids, paths)))
+
+
+def compare_with_matplotlib(grid, grid_bounds, max_p99=PARITY_P99):
+    """
+    Render grid both ways and compare after resizing the matplotlib image to
+    the grid size. Returns (mean, 99th percentile) absolute difference per
+    RGBA channel value (0–255), with timings of each renderer and "ok" when
+    the 99th percentile is within max_p99. Both images are written to a
+    temporary directory that is removed afterwards.
+
+    The matplotlib render is the slow path this module replaces, so this is
+    a benchmark (python -m utils.heatmap), not a pipeline step.
+    """
+    from utils import visualization
+
+    with tempfile.TemporaryDirectory() as tmp:
+        matplotlib_png = os.path.join(tmp, "matplotlib.png")
+        lut_png = os.path.join(tmp, "lut.png")
+
+        start = time.perf_counter()
+        visualization.render_idw_heatmap(grid, grid_bounds, matplotlib_png)
+        matplotlib_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        render_heatmap(grid, lut_png)
+        lut_seconds = time.perf_counter() - start
+
+        lut = np.asarray(Image.open(lut_png), dtype=np.int16)
+        with Image.open(matplotlib_png) as image:
+            matplotlib_size = image.size
+            reference = image.convert("RGBA").resize(lut.shape[1::-1], Image.BILINEAR)
+        reference = np.asarray(reference, dtype=np.int16)
+
+    diff = np.abs(lut - reference)
+    result = {
+        "mean_abs_diff": float(diff.mean()),
+        "p99_abs_diff": float(np.percentile(diff, 99)),
+        "matplotlib_size": matplotlib_size,
+        "lut_size": lut.shape[1::-1],
+        "matplotlib_seconds": round(matplotlib_seconds, 2),
+        "lut_seconds": round(lut_seconds, 3),
+    }
+    result["ok"] = result["p99_abs_diff"] <= max_p99
+    if result["ok"]:
+        print(f"✅ LUT heatmap matches matplotlib (mean |Δ| {result['mean_abs_diff']:.2f}, p99 {result['p99_abs_diff']:.0f})")
+    else:
+        print(
+            f"⚠️ LUT heatmap differs from matplotlib: p99 |Δ| {result['p99_abs_diff']:.0f} > {max_p99} "
+            f"(mean {result['mean_abs_diff']:.2f})"
+        )
+    return result
+
+
+def benchmark_parity(n_sensors=105, grid_resolution=400, seed=0):
+    """
+    Interpolate random sensor values over Sweden and compare the LUT render
+    of the grid with the matplotlib one; see compare_with_matplotlib.
+    """
+    from utils.interpolation import IDWInterpolator
+
+    rng = np.random.default_rng(seed)
+    points = np.column_stack([rng.uniform(11, 24, n_sensors), rng.uniform(55, 69, n_sensors)])
+    bounds = (10.5, 55, 24.5, 69.5)
+    grid = IDWInterpolator(points, bounds, grid_resolution).interpolate(rng.gamma(2, 5, n_sensors))
+    return compare_with_matplotlib(grid, bounds)
+
+
+if __name__ == "__main__":
+    result = benchmark_parity()
+    print(f"⏱️ matplotlib {result['matplotlib_seconds']}s, LUT {result['lut_seconds']}s")
+    sys.exit(0 if result["ok"] else 1)
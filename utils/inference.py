@@ -0,0 +1,401 @@
+import hashlib
+import json
+import time
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from utils import feature_engineering, global_model, packed_forest, training, training_data
+
+
+N_CLOSEST = 3   # Neighbours averaged into pm25_nearby_avg
+MAX_LAG = 3     # Deepest lag / rolling window in the AQ features
+
+STATE_FILE = "forecast_state.json"               # Forecast start + sensor_id → input fingerprint of the stored forecast
+PREDICTIONS_FILE = "forecast_predictions.parquet"
+
+
+def dense_panel(frame, columns, dates=None):
+    """
+    Pivot a long frame to dense (sensor × day) arrays.
+
+    Returns (sensor_ids, dates, {column: array[S, T]}) where every calendar
+    day gets a slot (NaN where missing). Columns absent from frame are all-NaN.
+    """
+    sensor_ids = np.sort(frame["sensor_id"].unique())
+    if dates is None:
+        dates = pd.date_range(frame["date"].min(), frame["date"].max(), freq="D")
+
+    s_idx = np.searchsorted(sensor_ids, frame["sensor_id"].to_numpy())
+    t_idx = ((frame["date"] - dates[0]) // pd.Timedelta(days=1)).to_numpy()
+    inside = (t_idx >= 0) & (t_idx < len(dates))
+    s_idx, t_idx = s_idx[inside], t_idx[inside]
+
+    arrays = {}
+    for col in columns:
+        arr = np.full((len(sensor_ids), len(dates)), np.nan)
+        if col in frame.columns:
+            arr[s_idx, t_idx] = pd.to_numeric(frame[col], errors="coerce").to_numpy()[inside]
+        arrays[col] = arr
+
+    return sensor_ids, dates, arrays
+
+
+def neighbour_index(sensor_ids, sensor_locations, n_closest=N_CLOSEST):
+    """
+    Return int array[S, n_closest] of neighbour positions in sensor_ids (-1 = none).
+
+    Uses the same nearest-sensor rule as feature_engineering.add_nearby_sensor_feature.
+    """
+    coordinates = global_model.sensor_coordinates(sensor_locations)
+    closest = feature_engineering.compute_closest_sensors(coordinates.to_dict(orient="index"), n_closest)
+
+    positions = {int(sid): i for i, sid in enumerate(sensor_ids)}
+    index = np.full((len(sensor_ids), n_closest), -1, dtype=np.int64)
+    for i, sid in enumerate(sensor_ids):
+        for j, neighbour in enumerate(closest.get(int(sid), [])):
+            index[i, j] = positions.get(int(neighbour), -1)
+    return index
+
+
+def _nanmean(values, axis):
+    """np.nanmean without the all-NaN warning (all-NaN slices stay NaN)."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        return np.nanmean(values, axis=axis)
+
+
+def nearby_average(lag_1d, neighbours):
+    """Mean of each sensor's neighbours' lag_1d values; lag_1d is array[..., S]."""
+    padded = np.concatenate([lag_1d, np.full(lag_1d.shape[:-1] + (1,), np.nan, dtype=lag_1d.dtype)], axis=-1)
+    return _nanmean(padded[..., neighbours], axis=-1)  # index -1 picks the NaN padding column
+
+
+def aq_features(lags, neighbours):
+    """
+    AQ features for one forecast day from the last MAX_LAG daily values.
+
+    lags is array[MAX_LAG, ..., S] with lags[0] the day before. Mirrors
+    feature_engineering: lagged values, a 3-day rolling mean (min_periods=1)
+    and the nearby-sensor average of lag_1d.
+    """
+    return {
+        "pm25_lag_1d": lags[0],
+        "pm25_lag_2d": lags[1],
+        "pm25_lag_3d": lags[2],
+        "pm25_rolling_3d": _nanmean(lags[:3], axis=0),
+        "pm25_nearby_avg": nearby_average(lags[0], neighbours),
+    }
+
+
+def group_models(models):
+    """
+    Group sensors that share a model object.
+
+    models maps sensor_id → XGBRegressor. Returns [(model, feature_names,
+    [sensor_id, ...])].
+    """
+    groups = {}
+    for sensor_id, model in models.items():
+        groups.setdefault(id(model), (model, model.get_booster().feature_names, []))[2].append(sensor_id)
+    return list(groups.values())
+
+
+def fill_forecast(batch_data, predictions, target=training.TARGET):
+    """Merge predictions into batch_data and fill its missing PM2.5 with them, as the row-wise loop did."""
+    filled = batch_data.drop(columns=[c for c in predictions.columns if c.startswith("predicted_") or c == "days_before_forecast_day"], errors="ignore")
+    filled = filled.merge(predictions, on=["date", "sensor_id"], how="left")
+    filled[target] = filled[target].fillna(filled["predicted_pm25"])
+    return filled
+
+
+def run_forecast(
+    batch_data,
+    models,
+    sensor_locations,
+    forecast_days,
+    today,
+    global_xgb=None,
+    global_state=None,
+    n_closest=N_CLOSEST,
+    target=training.TARGET,
+    packed=None,
+    sensors=None,
+):
+    """
+    Recursive multi-day forecast for every sensor, one day at a time.
+
+    batch_data holds the recent observations merged with the weather rows
+    for the forecast days. Per forecast day the lag, rolling and nearby
+    features are computed for all sensors at once from the in-memory PM2.5
+    array; each model group predicts its sensors in one call, and the
+    predictions fill the days without an observation for the following day.
+    Sensors without a per-sensor model use global_xgb/global_state when given.
+    With packed (packed_forest.pack_models(models)) all packed sensors are
+    predicted in one NumPy traversal per day instead of one call per model.
+    With sensors, only those sensors are predicted; the others' PM2.5 for the
+    forecast days must already be filled in batch_data (see
+    run_incremental_forecast).
+
+    Returns (predictions, batch_data) in the shape the inference notebook
+    uses: predictions has date, sensor_id, predicted_pm25,
+    days_before_forecast_day and predicted_<feature> columns; batch_data gets
+    the missing PM2.5 values filled with the predictions.
+    """
+    start = time.perf_counter()
+    forecast_days = sorted({pd.Timestamp(d) for d in forecast_days})
+    today = pd.Timestamp(today)
+
+    packed_sensors = set(packed["sensor_ids"]) if packed is not None else set()
+    groups = group_models({sid: m for sid, m in models.items() if int(sid) not in packed_sensors})
+    columns = {target}.union(*(names for _, names, _ in groups))
+    if packed is not None:
+        columns |= set(packed["columns"])
+    if global_xgb is not None:
+        columns |= set(global_state["feature_names"])
+
+    dates = pd.date_range(min(batch_data["date"].min(), forecast_days[0]), forecast_days[-1], freq="D")
+    sensor_ids, dates, arrays = dense_panel(batch_data, sorted(columns), dates=dates)
+    present = dense_panel(batch_data.assign(_present=1.0), ["_present"], dates=dates)[2]["_present"] == 1
+    pm25 = arrays[target]
+
+    positions = {int(sid): i for i, sid in enumerate(sensor_ids)}
+    groups = [
+        (model, names, np.array([positions[int(s)] for s in sensors if int(s) in positions], dtype=np.int64))
+        for model, names, sensors in groups
+    ]
+    packed_idx = np.array([positions[int(s)] for s in packed_sensors if int(s) in positions], dtype=np.int64)
+    global_idx = np.array([i for i, sid in enumerate(sensor_ids) if sid not in models], dtype=np.int64)
+    if sensors is not None:
+        active = np.isin(sensor_ids, np.asarray(list(sensors), dtype=sensor_ids.dtype))
+        groups = [(model, names, idx[active[idx]]) for model, names, idx in groups]
+        packed_idx = packed_idx[active[packed_idx]]
+        global_idx = global_idx[active[global_idx]]
+    neighbours = neighbour_index(sensor_ids, sensor_locations, n_closest)
+
+    frames = []
+    for day in forecast_days:
+        t = dates.get_loc(day)
+        lags = np.stack([pm25[:, t - k - 1] if t - k - 1 >= 0 else np.full(len(sensor_ids), np.nan) for k in range(MAX_LAG)])
+        features = aq_features(lags, neighbours)
+        predicted = np.full(len(sensor_ids), np.nan)
+
+        for model, names, idx in groups:
+            idx = idx[present[idx, t]]
+            if len(idx) == 0:
+                continue
+            X = np.column_stack([features[n][idx] if n in features else arrays[n][idx, t] for n in names])
+            predicted[idx] = model.get_booster().inplace_predict(X)
+
+        if len(packed_idx):
+            idx = packed_idx[present[packed_idx, t]]
+            if len(idx):
+                X = np.column_stack([features[n][idx] if n in features else arrays[n][idx, t] for n in packed["columns"]])
+                predicted[idx] = packed_forest.predict_packed(packed, X, sensor_ids[idx])
+
+        if global_xgb is not None and len(global_idx):
+            idx = global_idx[present[global_idx, t]]
+            if len(idx):
+                rows = pd.DataFrame({
+                    n: features[n][idx] if n in features else arrays[n][idx, t]
+                    for n in global_state["feature_names"]
+                    if n in features or n in arrays
+                })
+                rows["sensor_id"] = sensor_ids[idx]
+                predicted[idx] = global_model.predict_global(global_xgb, global_state, rows, sensor_locations)
+
+        done = ~np.isnan(predicted)
+        pm25[:, t] = np.where(np.isnan(pm25[:, t]) & done, predicted, pm25[:, t])
+
+        frame = pd.DataFrame({
+            "date": day,
+            "sensor_id": sensor_ids[done],
+            "predicted_pm25": predicted[done],
+            "days_before_forecast_day": float((day - today).days),
+        })
+        for col in training_data.AQ_FEATURES:
+            frame[f"predicted_{col}"] = features[col][done]
+        frames.append(frame)
+
+    predictions = pd.concat(frames, ignore_index=True)
+    predictions["sensor_id"] = predictions["sensor_id"].astype(batch_data["sensor_id"].dtype)
+
+    filled = fill_forecast(batch_data, predictions, target)
+
+    print(
+        f"✅ Forecast {len(predictions)} rows for {predictions['sensor_id'].nunique()} sensors × "
+        f"{len(forecast_days)} days with {len(groups) + (global_xgb is not None) + bool(packed_sensors)} model groups "
+        f"in {time.perf_counter() - start:.2f}s"
+    )
+    return predictions, filled
+
+
+def input_fingerprints(
+    batch_data,
+    models,
+    sensor_locations,
+    forecast_days,
+    today,
+    versions=None,
+    global_state=None,
+    n_closest=N_CLOSEST,
+    target=training.TARGET,
+):
+    """
+    Fingerprint every sensor's forecast inputs.
+
+    Covers the PM2.5 observations from MAX_LAG days before the first forecast
+    day onwards, the model's other inputs (weather) for the forecast days,
+    which rows exist, the neighbour ids and the model version (versions maps
+    sensor_id → version). Days are hashed by position relative to the first
+    forecast day, not by date, so a sensor whose inputs merely shift by a
+    day keeps its fingerprint. Returns (sensor_ids, neighbours,
+    {sensor_id: hex digest}).
+    """
+    forecast_days = sorted({pd.Timestamp(d) for d in forecast_days})
+    models = {int(sid): model for sid, model in models.items()}
+    versions = {int(sid): v for sid, v in (versions or {}).items()}
+    feature_names = {sid: model.get_booster().feature_names for sid, model in models.items()}
+    global_names = global_state["feature_names"] if global_state is not None else []
+
+    columns = {target}.union(*feature_names.values(), global_names) - set(training_data.AQ_FEATURES)
+    dates = pd.date_range(forecast_days[0] - pd.Timedelta(days=MAX_LAG), forecast_days[-1], freq="D")
+    sensor_ids, dates, arrays = dense_panel(batch_data, sorted(columns), dates=dates)
+    present = dense_panel(batch_data.assign(_present=1.0), ["_present"], dates=dates)[2]["_present"] == 1
+    neighbours = neighbour_index(sensor_ids, sensor_locations, n_closest)
+
+    fingerprints = {}
+    for i, sid in enumerate(sensor_ids):
+        names = feature_names.get(int(sid), global_names)
+        h = hashlib.sha256(json.dumps({
+            "days": len(dates),
+            "forecast_days": [(day - forecast_days[0]).days for day in forecast_days],
+            "today": (pd.Timestamp(today) - forecast_days[0]).days,
+            "version": versions.get(int(sid)),
+            "features": list(names),
+            "neighbours": [int(sensor_ids[j]) for j in neighbours[i] if j >= 0],
+        }, sort_keys=True).encode())
+        h.update(present[i].tobytes())
+        for col in sorted({target, *names} & columns):
+            h.update(arrays[col][i].tobytes())
+        fingerprints[int(sid)] = h.hexdigest()
+
+    return sensor_ids, neighbours, fingerprints
+
+
+def dirty_closure(dirty, neighbours, max_hops):
+    """
+    Add every sensor whose pm25_nearby_avg reads (transitively) from a dirty
+    sensor. A change moves one neighbour hop per forecast day, so max_hops
+    (the number of forecast days) bounds the spread.
+    """
+    dirty = dirty.copy()
+    for _ in range(max_hops):
+        grown = dirty | np.append(dirty, False)[neighbours].any(axis=1)  # index -1 picks the False padding
+        if (grown == dirty).all():
+            break
+        dirty = grown
+    return dirty
+
+
+def load_forecast_state(state_dir):
+    """Return ({sensor_id: fingerprint}, stored predictions or None, first forecast day or None)."""
+    state_path = Path(state_dir) / STATE_FILE
+    predictions_path = Path(state_dir) / PREDICTIONS_FILE
+    if not state_path.exists() or not predictions_path.exists():
+        return {}, None, None
+    with open(state_path) as f:
+        state = json.load(f)
+    if "fingerprints" not in state:
+        return {}, None, None  # Written before fingerprints were relative to the forecast start
+    fingerprints = {int(sid): fp for sid, fp in state["fingerprints"].items()}
+    return fingerprints, pd.read_parquet(predictions_path), pd.Timestamp(state["forecast_start"])
+
+
+def save_forecast_state(state_dir, fingerprints, predictions, forecast_start):
+    state_dir = Path(state_dir)
+    state_dir.mkdir(parents=True, exist_ok=True)
+    predictions.to_parquet(state_dir / PREDICTIONS_FILE, index=False)
+    # The fingerprints are written last so a partial save is never treated as a hit
+    tmp = state_dir / f"{STATE_FILE}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({
+            "forecast_start": str(pd.Timestamp(forecast_start).date()),
+            "fingerprints": {str(sid): fp for sid, fp in fingerprints.items()},
+        }, f, indent=2, sort_keys=True)
+    tmp.replace(state_dir / STATE_FILE)
+
+
+def run_incremental_forecast(
+    batch_data,
+    models,
+    sensor_locations,
+    forecast_days,
+    today,
+    state_dir,
+    versions=None,
+    **forecast_kwargs,
+):
+    """
+    run_forecast that re-predicts only sensors whose inputs changed.
+
+    A sensor is dirty when its input fingerprint differs from the one stored
+    with the last forecast in state_dir, or when a sensor it reads
+    pm25_nearby_avg from is dirty. Clean sensors carry their stored
+    predictions forward, moved to the current forecast days when the
+    forecast start has advanced; those are filled into the PM2.5 series
+    first, so the dirty sensors see exactly the inputs a full run would
+    give them.
+    Returns (predictions, batch_data) like run_forecast.
+    """
+    start = time.perf_counter()
+    forecast_days = sorted({pd.Timestamp(d) for d in forecast_days})
+    target = forecast_kwargs.get("target", training.TARGET)
+
+    sensor_ids, neighbours, fingerprints = input_fingerprints(
+        batch_data,
+        models,
+        sensor_locations,
+        forecast_days,
+        today,
+        versions=versions,
+        global_state=forecast_kwargs.get("global_state"),
+        n_closest=forecast_kwargs.get("n_closest", N_CLOSEST),
+        target=target,
+    )
+    stored_fingerprints, stored, stored_start = load_forecast_state(state_dir)
+    if stored is not None and stored_start != forecast_days[0]:
+        # Same inputs relative to the forecast start give the same forecast, one start later
+        stored = stored.assign(date=stored["date"] + (forecast_days[0] - stored_start))
+        stored["days_before_forecast_day"] = (stored["date"] - pd.Timestamp(today)).dt.days.astype(float)
+
+    changed = np.array([stored_fingerprints.get(int(sid)) != fingerprints[int(sid)] for sid in sensor_ids], dtype=bool)
+    if stored is None:
+        changed[:] = True
+    dirty = dirty_closure(changed, neighbours, len(forecast_days))
+    clean_ids = sensor_ids[~dirty]
+
+    carried = (
+        stored[stored["sensor_id"].isin(clean_ids) & stored["date"].isin(forecast_days)]
+        if stored is not None else None
+    )
+    if carried is not None and len(carried):
+        carried = carried.astype({"sensor_id": batch_data["sensor_id"].dtype})
+
+    frames = [carried] if carried is not None and len(carried) else []
+    if dirty.any() or not frames:
+        inputs = batch_data if not frames else fill_forecast(batch_data, carried, target)[batch_data.columns]
+        fresh, _ = run_forecast(inputs, models, sensor_locations, forecast_days, today, sensors=sensor_ids[dirty], **forecast_kwargs)
+        frames.append(fresh)
+
+    predictions = pd.concat(frames, ignore_index=True).sort_values(["date", "sensor_id"], ignore_index=True)
+    save_forecast_state(state_dir, fingerprints, predictions, forecast_days[0])
+
+    print(
+        f"♻️ Re-forecast {int(dirty.sum())}/{len(sensor_ids)} sensors "
+        f"({int(changed.sum())} changed inputs, {int(dirty.sum() - changed.sum())} via neighbours), "
+        f"carried forward {len(clean_ids)} in {time.perf_counter() - start:.2f}s"
+    )
+    return predictions, fill_forecast(batch_data, predictions, target)
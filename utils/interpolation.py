@@ -0,0 +1,342 @@
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+from scipy.spatial.distance import cdist
+
+
+GRID_RESOLUTION = 800   # Grid cells per side
+POWER = 2               # IDW distance exponent
+MIN_DISTANCE = 1e-10    # Stands in for zero distance (grid point on top of a sensor)
+MAX_CACHED_LAYOUTS = 4  # Interpolators kept per process (one per sensor layout)
+
+MAX_WEIGHT_BYTES = 512 * 2**20  # Dense weight matrices larger than this are streamed instead of kept
+                                # (105 sensors on the 800² grid need ~269 MB)
+MAX_CACHED_WEIGHT_BYTES = 512 * 2**20  # Weights kept across all cached interpolators; older layouts
+                                       # are dropped first, the one in use is always kept
+CHUNK_BYTES = 32 * 2**20        # Working memory per block of grid points
+
+
+def grid_points(grid_bounds, grid_resolution=GRID_RESOLUTION):
+    """Return (points[G, 2] as lon/lat, grid shape) for a regular grid over (min_lon, min_lat, max_lon, max_lat)."""
+    min_lon, min_lat, max_lon, max_lat = grid_bounds
+    lon_mesh, lat_mesh = np.meshgrid(
+        np.linspace(min_lon, max_lon, grid_resolution),
+        np.linspace(min_lat, max_lat, grid_resolution),
+    )
+    return np.column_stack([lon_mesh.ravel(), lat_mesh.ravel()]), lon_mesh.shape
+
+
+def idw_weights(points, grid, power=POWER):
+    """Row-normalized inverse-distance weights, float32 array[G, S]."""
+    distances = cdist(grid, points)
+    distances[distances == 0] = MIN_DISTANCE
+    weights = distances ** -power
+    weights /= weights.sum(axis=1, keepdims=True)
+    return weights.astype(np.float32)
+
+
+def _blocks(n, bytes_per_item, chunk_bytes):
+    step = max(1, int(chunk_bytes // max(bytes_per_item, 1)))
+    for start in range(0, n, step):
+        yield slice(start, min(start + step, n))
+
+
+class IDWInterpolator:
+    """
+    IDW for one sensor layout and grid.
+
+    The weights depend only on geometry, so they are computed once; each
+    interpolate() call then needs one pass over the grid for any number of
+    horizons. Three modes, all processed in blocks of grid points so the
+    working memory stays under chunk_bytes:
+
+    - "dense": every sensor contributes; the normalized weight matrix is
+      kept when it fits in max_weight_bytes.
+    - "streamed": as dense, but weights are recomputed block by block
+      (for fine grids or many sensors).
+    - "nearest" (k and/or radius given): only the k nearest sensors within
+      radius contribute, found with a KD-tree; their indices and weights are
+      kept (k per grid point). Grid points with no sensor in range are NaN.
+    """
+
+    def __init__(
+        self,
+        points,
+        grid_bounds,
+        grid_resolution=GRID_RESOLUTION,
+        power=POWER,
+        k=None,
+        radius=None,
+        max_weight_bytes=MAX_WEIGHT_BYTES,
+        chunk_bytes=CHUNK_BYTES,
+    ):
+        self.points = np.asarray(points, dtype=np.float64)
+        self.power = power
+        self.chunk_bytes = chunk_bytes
+        self.grid, self.shape = grid_points(grid_bounds, grid_resolution)
+        n_grid, n_points = len(self.grid), len(self.points)
+
+        if k is not None or radius is not None:
+            self.mode = "nearest"
+            self.k = min(k or n_points, n_points)
+            tree = cKDTree(self.points)
+            self.neighbours = np.zeros((n_grid, self.k), dtype=np.int32)
+            self.weights = np.zeros((n_grid, self.k), dtype=np.float32)
+            for block in _blocks(n_grid, self.k * 32, chunk_bytes):
+                distances, index = tree.query(
+                    self.grid[block], k=self.k, distance_upper_bound=np.inf if radius is None else radius
+                )
+                distances = distances.reshape(-1, self.k)
+                index = index.reshape(-1, self.k)
+                found = np.isfinite(distances)  # misses come back as inf with index n_points
+                self.neighbours[block] = np.where(found, index, 0)
+                self.weights[block] = np.where(found, np.maximum(distances, MIN_DISTANCE) ** -power, 0)
+        elif n_grid * n_points * 4 <= max_weight_bytes:
+            self.mode = "dense"
+            self.weights = np.empty((n_grid, n_points), dtype=np.float32)
+            for block in _blocks(n_grid, n_points * 24, chunk_bytes):
+                self.weights[block] = idw_weights(self.points, self.grid[block], power)
+        else:
+            self.mode = "streamed"
+            self.weights = None
+
+    @property
+    def nbytes(self):
+        """Bytes of weights (and neighbour indices) kept between interpolate() calls."""
+        kept = [self.weights, getattr(self, "neighbours", None)]
+        return sum(array.nbytes for array in kept if array is not None)
+
+    def interpolate(self, values):
+        """
+        values is array[S] or array[S, H] in the order of points; NaN marks a
+        sensor without a value for that horizon, and the weights of the
+        remaining sensors are renormalized per horizon. Returns array[res, res]
+        or array[H, res, res].
+        """
+        values = np.asarray(values, dtype=np.float32)
+        squeeze = values.ndim == 1
+        values = values.reshape(len(self.points), -1)
+        horizons = values.shape[1]
+
+        present = ~np.isnan(values)
+        # Numerators and per-horizon weight sums of the present sensors in one product
+        stacked = np.concatenate([np.where(present, values, 0), present], axis=1).astype(np.float32)
+
+        numerator = np.empty((len(self.grid), horizons), dtype=np.float32)
+        denominator = np.empty((len(self.grid), horizons), dtype=np.float32)
+        if self.mode == "nearest":
+            per_point = self.k * 2 * horizons * 4 * 2
+        elif self.mode == "dense":
+            per_point = 2 * horizons * 4
+        else:
+            per_point = len(self.points) * 24
+        for block in _blocks(len(self.grid), per_point, self.chunk_bytes):
+            if self.mode == "nearest":
+                products = np.einsum("gk,gkh->gh", self.weights[block], stacked[self.neighbours[block]])
+            elif self.mode == "dense":
+                products = self.weights[block] @ stacked
+            else:
+                products = idw_weights(self.points, self.grid[block], self.power) @ stacked
+            numerator[block] = products[:, :horizons]
+            denominator[block] = products[:, horizons:]
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            grids = numerator / denominator
+
+        grids = grids.T.reshape(horizons, *self.shape)
+        return grids[0] if squeeze else grids
+
+
+class SensorLayout:
+    """
+    Sensors in a fixed order: sensor_ids as a pandas Index and coords as
+    array[S, 2] (lon, lat) in the same order, built once from the
+    sensor_locations dict. Value arrays from values() line up with coords,
+    so they can go straight to an interpolator or to query().
+    """
+
+    def __init__(self, sensor_locations):
+        self.sensor_ids = pd.Index(list(sensor_locations))
+        self.coords = np.array(
+            [[loc["longitude"], loc["latitude"]] for loc in sensor_locations.values()],
+            dtype=np.float64,
+        ).reshape(-1, 2)
+
+    def __len__(self):
+        return len(self.sensor_ids)
+
+    def values(self, predictions, dates, today=None, column="predicted_pm25", today_column="pm25"):
+        """
+        array[S, len(dates)] of each sensor's value per date: today_column on
+        `today`, column otherwise. Sensors without a (numeric) value on a
+        date are NaN; rows for sensors outside the layout are ignored.
+        """
+        dates = pd.DatetimeIndex(pd.to_datetime(list(dates)))
+        rows = predictions[predictions["date"].isin(dates)].drop_duplicates(["date", "sensor_id"])
+
+        sensor_pos = self.sensor_ids.get_indexer(rows["sensor_id"])
+        date_pos = dates.get_indexer(pd.to_datetime(rows["date"]))
+        on_today = (dates.date == today)[date_pos] if today is not None else np.zeros(len(rows), dtype=bool)
+
+        for name, needed in ((today_column, on_today.any()), (column, (~on_today).any())):
+            if needed and name not in rows.columns:
+                raise ValueError(f"Required column '{name}' not found")
+
+        def numeric(name):
+            if name not in rows.columns:
+                return np.full(len(rows), np.nan)
+            return pd.to_numeric(rows[name], errors="coerce").to_numpy(dtype=np.float64)
+
+        row_values = np.where(on_today, numeric(today_column), numeric(column))
+        values = np.full((len(self), len(dates)), np.nan)
+        known = sensor_pos >= 0
+        values[sensor_pos[known], date_pos[known]] = row_values[known]
+        return values
+
+    def interpolator(self, grid_bounds, grid_resolution=GRID_RESOLUTION, power=POWER, k=None, radius=None):
+        """Cached IDWInterpolator over all sensors of the layout."""
+        return interpolator_for(self.coords, grid_bounds, grid_resolution, power, k=k, radius=radius)
+
+    def query(self, values, lon, lat, power=POWER):
+        """
+        IDW estimate at arbitrary points from the same values array (S or
+        [S, H], NaN = no value). Returns array[Q] or array[Q, H].
+        """
+        query = np.column_stack([np.atleast_1d(lon), np.atleast_1d(lat)]).astype(np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        squeeze = values.ndim == 1
+        values = values.reshape(len(self), -1)
+
+        present = ~np.isnan(values)
+        weights = idw_weights(self.coords, query, power).astype(np.float64)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            estimates = (weights @ np.where(present, values, 0)) / (weights @ present)
+        return estimates[:, 0] if squeeze else estimates
+
+
+_INTERPOLATORS = OrderedDict()  # (points, grid, power, k, radius) → IDWInterpolator, least recently used first
+_INTERPOLATORS_LOCK = threading.Lock()
+
+
+def _build_interpolator(points, grid_bounds, grid_resolution, power, k, radius):
+    interpolator = IDWInterpolator(points, grid_bounds, grid_resolution, power, k=k, radius=radius)
+    print(
+        f"ℹ️ IDW weights for {len(points)} sensors on a {grid_resolution}² grid: {interpolator.mode} mode "
+        f"({interpolator.nbytes / 2**20:.0f} MB kept, limit {MAX_WEIGHT_BYTES / 2**20:.0f} MB)"
+    )
+    return interpolator
+
+
+def interpolator_for(points, grid_bounds, grid_resolution=GRID_RESOLUTION, power=POWER, k=None, radius=None):
+    """
+    IDWInterpolator for this layout, reused while the sensor coordinates, grid
+    and mode are unchanged. At most MAX_CACHED_LAYOUTS interpolators holding
+    MAX_CACHED_WEIGHT_BYTES of weights in total are kept per process.
+    """
+    points = np.ascontiguousarray(points, dtype=np.float64)
+    grid_bounds = tuple(float(b) for b in grid_bounds)
+    key = (points.tobytes(), grid_bounds, grid_resolution, power, k, radius)
+
+    with _INTERPOLATORS_LOCK:
+        interpolator = _INTERPOLATORS.pop(key, None)
+        if interpolator is None:
+            interpolator = _build_interpolator(points, grid_bounds, grid_resolution, power, k, radius)
+        _INTERPOLATORS[key] = interpolator
+
+        while len(_INTERPOLATORS) > 1 and (
+            len(_INTERPOLATORS) > MAX_CACHED_LAYOUTS
+            or sum(cached.nbytes for cached in _INTERPOLATORS.values()) > MAX_CACHED_WEIGHT_BYTES
+        ):
+            _INTERPOLATORS.popitem(last=False)
+    return interpolator
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return np.nan
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10  # bytes on macOS, KiB on Linux
+
+
+def _current_rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return _peak_rss_mb()
+
+
+def _measure(mode, n_sensors, grid_resolution, horizons, k, seed):
+    """Run one configuration in a fresh process; returns (seconds, RSS before MB, peak RSS MB)."""
+    from utils import visualization
+
+    rng = np.random.default_rng(seed)
+    points = np.column_stack([rng.uniform(11, 24, n_sensors), rng.uniform(55, 69, n_sensors)])
+    values = rng.gamma(2, 5, (n_sensors, horizons))
+    bounds = (10.5, 55, 24.5, 69.5)
+    baseline = _current_rss_mb()
+
+    start = time.perf_counter()
+    if mode == "legacy":
+        grid, shape = grid_points(bounds, grid_resolution)
+        lon_mesh = np.empty(shape)
+        for h in range(horizons):
+            visualization.idw_interpolation(points, values[:, h], grid, lon_mesh)
+    else:
+        options = {"k": k} if mode == "nearest" else {"max_weight_bytes": 0} if mode == "streamed" else {"max_weight_bytes": np.inf}
+        IDWInterpolator(points, bounds, grid_resolution, **options).interpolate(values)
+    return time.perf_counter() - start, baseline, _peak_rss_mb()
+
+
+def benchmark_idw(
+    n_sensors=(105, 1000),
+    grid_resolutions=(400, 800),
+    modes=("legacy", "dense", "streamed", "nearest"),
+    horizons=7,
+    k=8,
+    seed=0,
+):
+    """
+    Time every mode × sensor count × grid resolution for `horizons` grids,
+    each in its own process so peak RSS is not inherited from earlier runs.
+    Returns a DataFrame with seconds, peak RSS and the increase over the
+    RSS before the run (MB); a run that runs out of memory is reported with
+    NaN.
+    """
+    rows = []
+    for n in n_sensors:
+        for resolution in grid_resolutions:
+            for mode in modes:
+                try:
+                    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                        seconds, baseline, peak = pool.submit(_measure, mode, n, resolution, horizons, k, seed).result()
+                except (BrokenProcessPool, MemoryError) as e:
+                    print(f"❌ {mode:>8} {n:>5} sensors {resolution}²: {type(e).__name__}")
+                    rows.append({"mode": mode, "sensors": n, "grid_resolution": resolution,
+                                 "seconds": np.nan, "peak_rss_mb": np.nan, "added_rss_mb": np.nan})
+                    continue
+                rows.append({
+                    "mode": mode,
+                    "sensors": n,
+                    "grid_resolution": resolution,
+                    "seconds": round(seconds, 2),
+                    "peak_rss_mb": round(peak),
+                    "added_rss_mb": round(peak - baseline),
+                })
+                print(f"⏱️ {mode:>8} {n:>5} sensors {resolution}²: {seconds:6.2f}s, +{peak - baseline:,.0f} MB")
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    print(benchmark_idw().to_string(index=False))
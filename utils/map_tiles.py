@@ -0,0 +1,245 @@
+import hashlib
+import json
+import math
+import os
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from utils import heatmap, hopsworks_admin
+
+
+TILE_SIZE = 256        # Pixels per tile side
+MIN_ZOOM = 0           # Coarsest zoom level written
+MAX_ZOOM = 7           # Finest zoom level written; the map upsamples beyond it
+MANIFEST_FILE = "tiles.json"
+PUBLISHED_FILE = ".published"  # Grid key of the last archive uploaded from a tile directory
+IMAGE_FORMATS = {"png": "PNG", "webp": "WEBP"}
+CLIP_PADDING = 0.1     # Margin around the sensors, as a fraction of their extent
+REMOTE_DIR = "Resources/airquality/tiles"  # One {day}d.zip per horizon, served by netlify/functions/api.py
+
+
+def _tile_hash(data):
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+
+def lon_to_x(lon, zoom):
+    """Fractional Web Mercator tile column of a longitude."""
+    return (np.asarray(lon) + 180.0) / 360.0 * 2**zoom
+
+
+def lat_to_y(lat, zoom):
+    """Fractional Web Mercator tile row of a latitude (row 0 at the top)."""
+    lat = np.radians(np.asarray(lat))
+    return (1.0 - np.arcsinh(np.tan(lat)) / math.pi) / 2.0 * 2**zoom
+
+
+def y_to_lat(y, zoom):
+    return np.degrees(np.arctan(np.sinh(math.pi * (1.0 - 2.0 * np.asarray(y) / 2**zoom))))
+
+
+def tile_range(grid_bounds, zoom):
+    """(x_min, x_max, y_min, y_max) of the tiles that cover grid_bounds, inclusive."""
+    min_lon, min_lat, max_lon, max_lat = grid_bounds
+    last = 2**zoom - 1
+    x_min, x_max = (int(np.clip(math.floor(v), 0, last)) for v in lon_to_x([min_lon, max_lon], zoom))
+    y_min, y_max = (int(np.clip(math.floor(v), 0, last)) for v in lat_to_y([max_lat, min_lat], zoom))
+    return x_min, x_max, y_min, y_max
+
+
+def clip_bounds(grid_bounds, lons, lats, padding=CLIP_PADDING):
+    """The sensors' bounding box plus padding, intersected with grid_bounds."""
+    min_lon, min_lat, max_lon, max_lat = grid_bounds
+    lons, lats = np.asarray(lons, dtype=float), np.asarray(lats, dtype=float)
+    pad_lon = (lons.max() - lons.min()) * padding
+    pad_lat = (lats.max() - lats.min()) * padding
+    return (
+        max(min_lon, float(lons.min() - pad_lon)),
+        max(min_lat, float(lats.min() - pad_lat)),
+        min(max_lon, float(lons.max() + pad_lon)),
+        min(max_lat, float(lats.max() + pad_lat)),
+    )
+
+
+def pyramid_tiles(grid_bounds, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM):
+    """Every (z, x, y) covering grid_bounds from min_zoom to max_zoom."""
+    tiles = []
+    for z in range(min_zoom, max_zoom + 1):
+        x_min, x_max, y_min, y_max = tile_range(grid_bounds, z)
+        tiles.extend((z, x, y) for x in range(x_min, x_max + 1) for y in range(y_min, y_max + 1))
+    return tiles
+
+
+def _axis_weights(coords, low, high, n):
+    """Bilinear sample positions along one grid axis; NaN weight outside [low, high]."""
+    position = (coords - low) / (high - low) * (n - 1)
+    inside = (position >= 0) & (position <= n - 1)
+    position = np.clip(position, 0, n - 1)
+    i0 = np.minimum(position.astype(np.intp), n - 2)
+    weight = np.where(inside, position - i0, np.nan)
+    return i0, weight
+
+
+def sample_tile(grid, grid_bounds, z, x, y, tile_size=TILE_SIZE):
+    """
+    Bilinearly sample a grid (row 0 = min latitude) at the pixel centres of
+    tile z/x/y. Returns array[tile_size, tile_size] with row 0 at the top;
+    pixels outside grid_bounds are NaN.
+    """
+    min_lon, min_lat, max_lon, max_lat = grid_bounds
+    n_lat, n_lon = grid.shape
+    pixels = np.arange(tile_size) + 0.5
+
+    lons = (x + pixels / tile_size) / 2**z * 360.0 - 180.0
+    lats = y_to_lat(y + pixels / tile_size, z)
+    col, wx = _axis_weights(lons, min_lon, max_lon, n_lon)
+    row, wy = _axis_weights(lats, min_lat, max_lat, n_lat)
+
+    wx = wx[None, :]
+    wy = wy[:, None]
+    top = grid[row][:, col] * (1 - wx) + grid[row][:, col + 1] * wx
+    bottom = grid[row + 1][:, col] * (1 - wx) + grid[row + 1][:, col + 1] * wx
+    return (top * (1 - wy) + bottom * wy).astype(np.float32)
+
+
+def _load_manifest(out_dir):
+    path = Path(out_dir) / MANIFEST_FILE
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def write_tile_pyramid(
+    grid,
+    grid_bounds,
+    out_dir,
+    min_zoom=MIN_ZOOM,
+    max_zoom=MAX_ZOOM,
+    image_format="png",
+    max_workers=None,
+    tile_bounds=None,
+):
+    """
+    Write grid as an XYZ tile pyramid out_dir/{z}/{x}/{y}.{png|webp}.
+
+    Only tiles covering tile_bounds (default: grid_bounds, see clip_bounds)
+    are written; pixels are still sampled from the whole grid.
+
+    Tiles share one colour range (that of the whole grid, as for the single
+    image). A manifest in out_dir keeps a hash of every tile's pixels, so a
+    tile whose pixels did not change since the previous run is not encoded
+    or written again, and an unchanged grid is skipped outright. Tiles of a
+    previous run that are no longer in the pyramid are removed. Returns
+    counts of written, skipped and removed tiles.
+    """
+    start = time.perf_counter()
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"image_format must be one of {sorted(IMAGE_FORMATS)}")
+    grid = np.asarray(grid, dtype=np.float32)
+    if np.isnan(grid).all():
+        raise ValueError("No valid sensor data for this grid")
+
+    out_dir = Path(out_dir)
+    vmin, vmax = heatmap.color_range(grid)
+    tile_bounds = tuple(map(float, tile_bounds if tile_bounds is not None else grid_bounds))
+    grid_key = _tile_hash(
+        grid.tobytes() + json.dumps([list(map(float, grid_bounds)), tile_bounds, vmin, vmax, image_format]).encode()
+    )
+    tiles = pyramid_tiles(tile_bounds, min_zoom, max_zoom)
+    names = [f"{z}/{x}/{y}" for z, x, y in tiles]
+
+    previous = _load_manifest(out_dir)
+    previous_tiles = previous.get("tiles", {}) if previous.get("format") == image_format else {}
+    stats = {"tiles": len(tiles), "written": 0, "skipped": 0, "removed": 0}
+
+    if (
+        previous.get("grid") == grid_key
+        and list(previous_tiles) == names
+        and all((out_dir / f"{name}.{image_format}").exists() for name in names)
+    ):
+        stats["skipped"] = len(tiles)
+        stats["seconds"] = round(time.perf_counter() - start, 2)
+        return stats
+
+    def render(tile, name):
+        rgba = heatmap.lookup(sample_tile(grid, grid_bounds, *tile), vmin, vmax)
+        digest = _tile_hash(rgba.tobytes())
+        path = out_dir / f"{name}.{image_format}"
+        if previous_tiles.get(name) == digest and path.exists():
+            return digest, False
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.tmp")
+        Image.fromarray(rgba, "RGBA").save(tmp, format=IMAGE_FORMATS[image_format], lossless=True)
+        os.replace(tmp, path)
+        return digest, True
+
+    with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as pool:
+        results = list(pool.map(render, tiles, names))
+
+    for name in set(previous_tiles) - set(names):
+        path = out_dir / f"{name}.{image_format}"
+        if path.exists():
+            path.unlink()
+            stats["removed"] += 1
+
+    stats["written"] = sum(written for _, written in results)
+    stats["skipped"] = len(tiles) - stats["written"]
+
+    manifest = {
+        "grid": grid_key,
+        "format": image_format,
+        "bounds": list(map(float, grid_bounds)),
+        "tile_bounds": list(tile_bounds),
+        "min_zoom": min_zoom,
+        "max_zoom": max_zoom,
+        "color_range": [vmin, vmax],
+        "tiles": {name: digest for name, (digest, _) in zip(names, results)},
+    }
+    tmp = out_dir / f"{MANIFEST_FILE}.tmp"
+    tmp.write_text(json.dumps(manifest))
+    os.replace(tmp, out_dir / MANIFEST_FILE)
+
+    stats["seconds"] = round(time.perf_counter() - start, 2)
+    return stats
+
+
+def publish_tiles(dataset_api, tile_dir, name, remote_dir=REMOTE_DIR):
+    """
+    Upload a tile directory written by write_tile_pyramid as one uncompressed
+    zip (remote_dir/{name}.zip, tiles plus manifest). Skipped when the
+    directory's grid was already published. Returns True when the remote
+    archive is current.
+    """
+    tile_dir = Path(tile_dir)
+    manifest = _load_manifest(tile_dir)
+    published = tile_dir / PUBLISHED_FILE
+    if not manifest:
+        return False
+    if published.exists() and published.read_text() == manifest["grid"]:
+        return True
+
+    archive = tile_dir.parent / f"{name}.zip"
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_STORED) as zf:  # PNG/WebP are already compressed
+        zf.write(tile_dir / MANIFEST_FILE, MANIFEST_FILE)
+        for tile in manifest["tiles"]:
+            zf.write(tile_dir / f"{tile}.{manifest['format']}", f"{tile}.{manifest['format']}")
+
+    try:
+        dataset_api.mkdir(remote_dir)
+    except Exception:
+        pass
+    ok = hopsworks_admin.safe_upload(dataset_api, str(archive), remote_dir)
+    if ok:
+        published.write_text(manifest["grid"])
+    print(
+        f"✅ Published {len(manifest['tiles'])} tiles to {remote_dir}/{archive.name} "
+        f"({archive.stat().st_size / 1024:.0f} KB)" if ok else f"❌ Failed to publish {remote_dir}/{archive.name}"
+    )
+    return ok
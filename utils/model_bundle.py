@@ -0,0 +1,133 @@
+import json
+import mmap
+import struct
+from collections.abc import Mapping
+from pathlib import Path
+
+from xgboost import XGBRegressor
+
+from utils import hopsworks_admin
+
+
+BUNDLE_FILE = "model_bundle.bin"
+REMOTE_PATH = f"Resources/models/{BUNDLE_FILE}"
+
+MAGIC = b"PM25BNDL"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sIQ")  # magic, format version, index length
+ALIGN = 8
+
+
+def write_bundle(models, path, entries=None):
+    """
+    Pack models (sensor_id → XGBRegressor) into one file.
+
+    Layout: header, JSON index (sensor_id → offset, length and the manifest
+    entry fields given in entries), then every booster as UBJSON, 8-byte
+    aligned. Returns the path.
+    """
+    entries = entries or {}
+    blobs = {int(sid): bytes(model.get_booster().save_raw("ubj")) for sid, model in models.items()}
+
+    index = {}
+    offset = 0
+    for sid, blob in blobs.items():
+        index[str(sid)] = {
+            **entries.get(sid, entries.get(str(sid), {})),
+            "sensor_id": sid,
+            "offset": offset,
+            "length": len(blob),
+        }
+        offset += len(blob) + (-len(blob) % ALIGN)
+
+    index_bytes = json.dumps(index, sort_keys=True).encode()
+    index_bytes += b" " * (-(HEADER.size + len(index_bytes)) % ALIGN)
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(index_bytes)))
+        f.write(index_bytes)
+        for blob in blobs.values():
+            f.write(blob)
+            f.write(b"\0" * (-len(blob) % ALIGN))
+    tmp.replace(path)
+
+    print(f"📦 Packed {len(blobs)} models into {path.name} ({path.stat().st_size / 1e6:.1f} MB)")
+    return path
+
+
+class ModelBundle(Mapping):
+    """
+    Read-only, memory-mapped view of a bundle: sensor_id → XGBRegressor.
+
+    Opening parses only the index; each model is parsed on first access and
+    kept. Works anywhere a models dict is expected (e.g.
+    inference.run_forecast).
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, index_length = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"{self.path} is not a model bundle (format {FORMAT_VERSION})")
+
+        self._data_start = HEADER.size + index_length
+        self.index = {int(k): v for k, v in json.loads(self._mm[HEADER.size:self._data_start]).items()}
+        self._models = {}
+
+    def entry(self, sensor_id):
+        return self.index[int(sensor_id)]
+
+    def __getitem__(self, sensor_id):
+        sensor_id = int(sensor_id)
+        if sensor_id not in self._models:
+            entry = self.index[sensor_id]
+            start = self._data_start + entry["offset"]
+            model = XGBRegressor()
+            model.load_model(bytearray(self._mm[start:start + entry["length"]]))
+            self._models[sensor_id] = model
+        return self._models[sensor_id]
+
+    def __contains__(self, sensor_id):
+        try:
+            return int(sensor_id) in self.index
+        except (TypeError, ValueError):
+            return False
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def publish_bundle(dataset_api, path, remote_path=REMOTE_PATH):
+    ok = hopsworks_admin.safe_upload(dataset_api, str(path), remote_path)
+    print(f"✅ Published {remote_path}" if ok else f"❌ Failed to publish {remote_path}")
+    return ok
+
+
+def download_bundle(dataset_api, local_dir, remote_path=REMOTE_PATH):
+    """Download and open the published bundle, or return None if there is none."""
+    try:
+        local_path = dataset_api.download(remote_path, local_path=str(local_dir), overwrite=True)
+        return ModelBundle(local_path)
+    except Exception as e:
+        print(f"ℹ️ No usable model bundle ({type(e).__name__}: {e})")
+        return None
@@ -0,0 +1,197 @@
+import hashlib
+import json
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+
+from xgboost import XGBRegressor
+
+
+INDEX_FILE = "index.json"
+MODEL_FILE = "model.json"
+
+DOWNLOAD_WORKERS = 8    # Parallel registry downloads
+MAX_LOADED_MODELS = 256 # Parsed models kept in memory per process
+
+
+def artifact_hash(model_dir):
+    """sha256 of the model.json in a downloaded artifact directory."""
+    return hashlib.sha256((Path(model_dir) / MODEL_FILE).read_bytes()).hexdigest()
+
+
+def load_index(cache_dir):
+    """Return dict: model name → {version (str) → artifact hash}"""
+    path = Path(cache_dir) / INDEX_FILE
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_index(cache_dir, index):
+    path = Path(cache_dir) / INDEX_FILE
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w") as f:
+        json.dump(index, f, indent=2, sort_keys=True)
+    tmp.replace(path)
+
+
+def object_dir(cache_dir, digest):
+    return Path(cache_dir) / "objects" / digest
+
+
+def _store(cache_dir, downloaded_dir):
+    """Copy a downloaded artifact into the content-addressed store; return its hash."""
+    digest = artifact_hash(downloaded_dir)
+    target = object_dir(cache_dir, digest)
+    if not (target / MODEL_FILE).exists():
+        tmp = target.with_name(f"{digest}.tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        shutil.copytree(downloaded_dir, tmp)
+        shutil.rmtree(target, ignore_errors=True)
+        tmp.replace(target)
+    return digest
+
+
+@lru_cache(maxsize=MAX_LOADED_MODELS)
+def load_model(model_path):
+    """Parse a model.json once per process; later calls return the same object."""
+    model = XGBRegressor()
+    model.load_model(model_path)
+    return model
+
+
+def latest_model(mr, name):
+    """Return the newest registry entry for name (metadata only, no download), or None."""
+    try:
+        available = mr.get_models(name=name)
+    except Exception:
+        return None
+    return max(available, key=lambda model: model.version) if available else None
+
+
+def fetch_models(mr, names, cache_dir, max_workers=DOWNLOAD_WORKERS):
+    """
+    Resolve the latest version of every model name, download only versions
+    missing from the local cache (in parallel) and load them.
+
+    Artifacts are stored once per content hash under cache_dir/objects; the
+    index maps (name, version) → hash, so an unchanged version is never
+    downloaded again. Returns dict: name → (registry model, XGBRegressor,
+    local artifact dir); names without a registered model, or whose
+    download failed, are left out.
+    """
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    index = load_index(cache_dir)
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        latest = dict(zip(names, pool.map(lambda name: latest_model(mr, name), names)))
+
+        to_download = []
+        for name, registered in latest.items():
+            if registered is None:
+                continue
+            digest = index.get(name, {}).get(str(registered.version))
+            if digest is None or not (object_dir(cache_dir, digest) / MODEL_FILE).exists():
+                to_download.append(name)
+
+        def download(name):
+            try:
+                return name, _store(cache_dir, latest[name].download())
+            except Exception as e:
+                print(f"❌ Could not download {name} v{latest[name].version}: {e}")
+                return name, None
+
+        failed = []
+        for name, digest in pool.map(download, to_download):
+            if digest is None:
+                failed.append(name)
+            else:
+                index.setdefault(name, {})[str(latest[name].version)] = digest
+
+    if len(failed) < len(to_download):
+        _save_index(cache_dir, index)
+    if failed:
+        print(f"⚠️ Dropped {len(failed)} models that failed to download: {', '.join(sorted(failed))}")
+
+    downloaded = len(to_download) - len(failed)
+    fetched = {}
+    for name, registered in latest.items():
+        if registered is None or name in failed:
+            continue
+        model_dir = object_dir(cache_dir, index[name][str(registered.version)])
+        fetched[name] = (registered, load_model(str(model_dir / MODEL_FILE)), str(model_dir))
+
+    print(
+        f"📦 Models: {len(fetched)}/{len(names)} resolved, {downloaded} downloaded, "
+        f"{len(fetched) - downloaded} from local cache ({time.perf_counter() - start:.1f}s)"
+    )
+    return fetched
+
+
+def fetch_manifest_models(mr, manifest, cache_dir, max_workers=DOWNLOAD_WORKERS):
+    """
+    Load every model listed in a training manifest.
+
+    Entries whose (name, version) is already cached with the manifest
+    checksum are loaded from disk without any registry call; the rest are
+    fetched by exact version in parallel and verified against the checksum.
+    Downloads that fail or do not match the checksum are left out, so the
+    caller can fall back to a registry lookup (fetch_models).
+    Returns dict: sensor_id → (manifest entry, XGBRegressor, local artifact dir).
+    """
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    index = load_index(cache_dir)
+    entries = list(manifest["models"].values())
+    start = time.perf_counter()
+
+    def cached_digest(entry):
+        digest = index.get(entry["model_name"], {}).get(str(entry["version"]))
+        if digest is None or not (object_dir(cache_dir, digest) / MODEL_FILE).exists():
+            return None
+        if entry.get("checksum") and digest != entry["checksum"]:
+            return None
+        return digest
+
+    def download(entry):
+        try:
+            registered = mr.get_model(entry["model_name"], version=entry["version"])
+            digest = _store(cache_dir, registered.download())
+        except Exception as e:
+            print(f"❌ Could not download {entry['model_name']} v{entry['version']}: {e}")
+            return entry, None
+        if entry.get("checksum") and digest != entry["checksum"]:
+            # Not indexed, so it is neither used nor mistaken for a cached copy later
+            print(f"❌ {entry['model_name']} v{entry['version']}: checksum differs from the manifest, not used")
+            return entry, None
+        return entry, digest
+
+    to_download = [entry for entry in entries if cached_digest(entry) is None]
+    downloaded = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for entry, digest in pool.map(download, to_download):
+            if digest is not None:
+                index.setdefault(entry["model_name"], {})[str(entry["version"])] = digest
+                downloaded += 1
+
+    if to_download:
+        _save_index(cache_dir, index)
+
+    fetched = {}
+    for entry in entries:
+        digest = index.get(entry["model_name"], {}).get(str(entry["version"]))
+        if digest is None:
+            continue
+        model_dir = object_dir(cache_dir, digest)
+        fetched[entry["sensor_id"]] = (entry, load_model(str(model_dir / MODEL_FILE)), str(model_dir))
+
+    print(
+        f"📦 Models from manifest: {len(fetched)}/{len(entries)} loaded, {downloaded} downloaded "
+        f"({time.perf_counter() - start:.1f}s)"
+    )
+    return fetched
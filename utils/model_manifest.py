@@ -0,0 +1,74 @@
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+
+from utils import hopsworks_admin
+
+
+MANIFEST_FILE = "model_manifest.json"
+REMOTE_DIR = "Resources/models"
+REMOTE_PATH = f"{REMOTE_DIR}/{MANIFEST_FILE}"
+
+
+def empty_manifest():
+    return {"updated_at": None, "models": {}}
+
+
+def manifest_entry(sensor_id, model_name, version, feature_name, feature_names, checksum, metrics=None):
+    """One manifest row: everything inference needs to pick and verify a model."""
+    return {
+        "sensor_id": int(sensor_id),
+        "model_name": model_name,
+        "version": int(version),
+        "feature_name": feature_name,
+        "feature_names": list(feature_names) if feature_names is not None else None,
+        "checksum": checksum,
+        "metrics": metrics or {},
+    }
+
+
+def set_entry(manifest, entry):
+    manifest["models"][str(entry["sensor_id"])] = entry
+
+
+def load_manifest(path):
+    """Return the manifest at path, or an empty manifest if it does not exist."""
+    path = Path(path)
+    if not path.exists():
+        return empty_manifest()
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    manifest["updated_at"] = datetime.now(timezone.utc).isoformat()
+    with open(path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return path
+
+
+def download_manifest(dataset_api, local_dir):
+    """Download the published manifest; returns an empty manifest if none is published yet."""
+    try:
+        local_path = dataset_api.download(REMOTE_PATH, local_path=str(local_dir), overwrite=True)
+    except Exception as e:
+        print(f"ℹ️ No published model manifest ({type(e).__name__}), starting a new one")
+        return empty_manifest()
+    return load_manifest(local_path)
+
+
+def publish_manifest(dataset_api, manifest, local_dir):
+    """Save the manifest locally and upload it next to the models."""
+    local_path = save_manifest(manifest, Path(local_dir) / MANIFEST_FILE)
+    try:
+        dataset_api.mkdir(REMOTE_DIR)
+    except Exception:
+        pass
+    ok = hopsworks_admin.safe_upload(dataset_api, str(local_path), REMOTE_PATH)
+    if ok:
+        print(f"✅ Published model manifest with {len(manifest['models'])} models to {REMOTE_PATH}")
+    else:
+        print(f"❌ Failed to publish model manifest to {REMOTE_PATH}")
+    return ok
@@ -0,0 +1,269 @@
+import itertools
+import time
+
+import numpy as np
+import xgboost as xgb
+from sklearn.metrics import mean_squared_error, r2_score
+
+from utils import training
+
+
+# Hyperparameter candidates, crossed with every feature set
+SEARCH_SPACE = {
+    "learning_rate": [0.05, 0.1, 0.3],
+    "max_depth": [3, 6],
+    "min_child_weight": [1, 5],
+}
+
+MIN_ROUNDS = 10             # Boosting rounds every candidate gets before the first cut
+MAX_ROUNDS = 300            # Round budget of the last surviving candidates
+ETA = 3                     # Keep the best 1/ETA candidates per rung and give them ETA× the rounds
+EARLY_STOPPING_ROUNDS = 20  # Stop boosting a candidate after this many rounds without validation improvement
+VALID_RATIO = 0.2           # Tail of the training rows used for early stopping and pruning
+
+
+def candidate_params(search_space=SEARCH_SPACE):
+    """Return the grid of hyperparameter dicts in search_space."""
+    keys = list(search_space)
+    return [dict(zip(keys, values)) for values in itertools.product(*(search_space[k] for k in keys))]
+
+
+def rung_schedule(n_candidates, min_rounds=MIN_ROUNDS, max_rounds=MAX_ROUNDS, eta=ETA):
+    """
+    Return the successive-halving rungs as [(n_candidates, total_rounds)].
+
+    Every rung keeps the best n // eta candidates and boosts them up to eta×
+    the rounds; the last rung boosts the survivors to max_rounds.
+    """
+    rungs = []
+    n, rounds = n_candidates, min_rounds
+    while n > 1 and rounds < max_rounds:
+        rungs.append((n, rounds))
+        n = max(1, n // eta)
+        rounds *= eta
+    rungs.append((n, max_rounds))
+    return rungs
+
+
+def _booster_params(params, n_jobs, seed):
+    return {
+        "objective": "reg:squarederror",
+        "eval_metric": "rmse",
+        "tree_method": "hist",
+        "eta": params["learning_rate"],
+        "max_depth": params["max_depth"],
+        "min_child_weight": params["min_child_weight"],
+        "nthread": n_jobs,
+        "seed": seed,
+    }
+
+
+def _advance(candidate, rounds, early_stopping_rounds, n_jobs, seed):
+    """Continue boosting a candidate up to `rounds` total; return the rounds added."""
+    todo = rounds - len(candidate["history"])
+    if candidate["stopped"] or todo <= 0:
+        return 0
+
+    evals_result = {}
+    candidate["booster"] = xgb.train(
+        _booster_params(candidate["params"], n_jobs, seed),
+        candidate["dtrain"],
+        num_boost_round=todo,
+        evals=[(candidate["dvalid"], "valid")],
+        evals_result=evals_result,
+        verbose_eval=False,
+        xgb_model=candidate["booster"],
+    )
+    candidate["history"].extend(evals_result["valid"]["rmse"])
+
+    best_round = int(np.argmin(candidate["history"]))
+    candidate["best_round"] = best_round
+    candidate["score"] = candidate["history"][best_round]
+    if len(candidate["history"]) - 1 - best_round >= early_stopping_rounds:
+        candidate["stopped"] = True
+
+    return todo
+
+
+def successive_halving(
+    candidates,
+    min_rounds=MIN_ROUNDS,
+    max_rounds=MAX_ROUNDS,
+    eta=ETA,
+    early_stopping_rounds=EARLY_STOPPING_ROUNDS,
+    n_jobs=None,
+    seed=training.BASE_SEED,
+):
+    """
+    Pick the best candidate by validation RMSE at a fraction of the cost of
+    training every candidate to max_rounds.
+
+    candidates are dicts with `feature_name`, `params`, `dtrain` and `dvalid`;
+    candidates of the same feature set share one QuantileDMatrix pair.
+    Boosters are continued across rungs, never retrained. Returns
+    (winner, total boosting rounds spent).
+    """
+    for candidate in candidates:
+        candidate.update({"booster": None, "history": [], "stopped": False})
+
+    survivors = list(candidates)
+    spent = 0
+    for n_keep, rounds in rung_schedule(len(candidates), min_rounds, max_rounds, eta):
+        survivors = sorted(survivors, key=lambda c: c.get("score", np.inf))[:n_keep]
+        for candidate in survivors:
+            spent += _advance(candidate, rounds, early_stopping_rounds, n_jobs, seed)
+
+    # Free pruned boosters and DMatrices held by the losing candidates
+    winner = min(survivors, key=lambda c: c["score"])
+    for candidate in candidates:
+        if candidate is not winner:
+            candidate.update({"booster": None, "dtrain": None, "dvalid": None})
+
+    return winner, spent
+
+
+def select_task(
+    sensor_id,
+    xgb_params,
+    search_space=SEARCH_SPACE,
+    min_rounds=MIN_ROUNDS,
+    max_rounds=MAX_ROUNDS,
+    eta=ETA,
+    early_stopping_rounds=EARLY_STOPPING_ROUNDS,
+    valid_ratio=VALID_RATIO,
+    base_seed=training.BASE_SEED,
+    train_ratio=training.TRAIN_RATIO,
+    min_rows=training.MIN_ROWS,
+    min_test_rows=training.MIN_TEST_ROWS,
+    target=training.TARGET,
+    exclude_cols=training.EXCLUDE_COLS,
+    **_,
+):
+    """
+    Select feature set and hyperparameters for one sensor by successive halving.
+
+    The time-ordered training rows are split again: the last valid_ratio
+    drives early stopping and pruning, the test rows stay untouched. The
+    winner is refit on all training rows with its best round count and
+    scored on the same test rows as training.train_task, so the output has
+    the same shape. Unused keyword arguments (e.g. n_restarts) are ignored.
+    """
+    partitions = training.worker_partitions()
+    nthread = training.worker_nthread()
+    candidates = []
+    split = None
+    convert_seconds = 0.0
+    for feature_name, sensor_frames in partitions.items():
+        df = sensor_frames.get(sensor_id)
+        if df is None or len(df) < min_rows:
+            continue
+
+        train_size = int(train_ratio * len(df))
+        valid_size = max(min_test_rows, int(valid_ratio * train_size))
+        if len(df) - train_size < min_test_rows or train_size - valid_size < min_test_rows:
+            continue
+
+        feature_cols = training.feature_columns(df, exclude_cols)
+        fit_df = df.iloc[:train_size - valid_size]
+        valid_df = df.iloc[train_size - valid_size:train_size]
+        convert_start = time.perf_counter()
+        dtrain, dvalid = training.build_dmatrices(fit_df, valid_df, feature_cols, target, nthread=nthread)
+        convert_seconds += time.perf_counter() - convert_start
+
+        split = split or (train_size, len(df) - train_size)
+        for params in candidate_params(search_space):
+            candidates.append({
+                "feature_name": feature_name,
+                "feature_cols": feature_cols,
+                "params": params,
+                "dtrain": dtrain,
+                "dvalid": dvalid,
+            })
+
+    if not candidates:
+        return None
+
+    boost_start = time.perf_counter()
+    winner, spent = successive_halving(
+        candidates,
+        min_rounds=min_rounds,
+        max_rounds=max_rounds,
+        eta=eta,
+        early_stopping_rounds=early_stopping_rounds,
+        n_jobs=nthread,
+        seed=base_seed,
+    )
+    boost_seconds = time.perf_counter() - boost_start
+
+    df = partitions[winner["feature_name"]][sensor_id]
+    train_df = df.iloc[:split[0]]
+    test_df = df.iloc[split[0]:]
+    feature_cols = winner["feature_cols"]
+
+    convert_start = time.perf_counter()
+    dtrain, dtest = training.build_dmatrices(train_df, test_df, feature_cols, target, nthread=nthread)
+    convert_seconds += time.perf_counter() - convert_start
+
+    boost_start = time.perf_counter()
+    n_rounds = winner["best_round"] + 1
+    booster = xgb.train(
+        _booster_params(winner["params"], nthread, base_seed),
+        dtrain,
+        num_boost_round=n_rounds,
+    )
+    pred = booster.predict(dtest)
+    boost_seconds += time.perf_counter() - boost_start
+
+    return {
+        "result": {
+            "feature_name": winner["feature_name"],
+            "sensor_id": sensor_id,
+            "R2": r2_score(test_df[target], pred),
+            "MSE": mean_squared_error(test_df[target], pred),
+            "train_size": len(train_df),
+            "test_size": len(test_df),
+            "last_train_date": train_df["date"].max(),
+            "params": winner["params"],
+            "n_rounds": n_rounds,
+            "valid_rmse": winner["score"],
+            "candidates": len(candidates),
+            "rounds_spent": spent + n_rounds,
+            "convert_seconds": convert_seconds,
+            "boost_seconds": boost_seconds,
+        },
+        "model": training.to_regressor(booster),
+        "y_pred": pred,
+    }
+
+
+def run_selection(partitions, xgb_params, max_workers=None, log_every=10, **select_kwargs):
+    """
+    Run successive-halving selection for every sensor across the process pool.
+
+    Returns (models, y_preds, results) like training.run_training, with one
+    result row per sensor (its winning feature set).
+    """
+    sensor_ids = sorted(set().union(*(frames.keys() for frames in partitions.values())))
+    start = time.perf_counter()
+
+    models, y_preds, results = training.run_training(
+        partitions,
+        xgb_params,
+        max_workers=max_workers,
+        log_every=log_every,
+        tasks=[(sensor_id,) for sensor_id in sensor_ids],
+        task_fn=select_task,
+        **select_kwargs,
+    )
+
+    if results:
+        spent = sum(row["rounds_spent"] for row in results)
+        n_restarts = select_kwargs.get("n_restarts", training.N_RESTARTS)
+        grid_rounds = len(training.build_tasks(partitions)) * n_restarts * xgb_params["n_estimators"]
+        print(
+            f"📊 Successive halving: {sum(row['candidates'] for row in results):,} candidates, "
+            f"{spent:,} boosting rounds vs {grid_rounds:,} for the {n_restarts}-restart grid "
+            f"({time.perf_counter() - start:.1f}s)"
+        )
+
+    return models, y_preds, results
@@ -0,0 +1,232 @@
+import hashlib
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+
+
+def _trees(model):
+    """Return (trees, base_score, feature_names) from a fitted XGBRegressor."""
+    booster = model.get_booster()
+    learner = json.loads(booster.save_raw("json"))["learner"]
+    if learner["objective"]["name"] != "reg:squarederror":
+        raise ValueError(f"Unsupported objective {learner['objective']['name']}")
+    if learner["gradient_booster"]["name"] != "gbtree":
+        raise ValueError("Only gbtree boosters can be packed")
+
+    base_score = float(learner["learner_model_param"]["base_score"].strip("[]"))
+    return learner["gradient_booster"]["model"]["trees"], base_score, booster.feature_names
+
+
+def pack_models(models):
+    """
+    Flatten the trees of many boosters into shared NumPy arrays.
+
+    models maps sensor_id → XGBRegressor. Node arrays (feature, threshold,
+    left, right, default_left, value) are concatenated across every tree of
+    every model, with child indices made global. Split features are remapped
+    to `columns`, the union of all models' feature names, so one input
+    matrix in that column order serves every model.
+    """
+    sensor_ids = [int(sid) for sid in models]
+    columns = []
+    column_pos = {}
+
+    feature, threshold, left, right, default_left, value = [], [], [], [], [], []
+    roots, tree_model = [], []
+    base_scores = np.zeros(len(sensor_ids), dtype=np.float32)
+    n_nodes = 0
+
+    for m, sensor_id in enumerate(sensor_ids):
+        trees, base_scores[m], names = _trees(models[sensor_id] if sensor_id in models else models[str(sensor_id)])
+        for name in names:
+            if name not in column_pos:
+                column_pos[name] = len(columns)
+                columns.append(name)
+        to_column = np.array([column_pos[name] for name in names], dtype=np.int32)
+
+        for tree in trees:
+            if any(tree["split_type"]):
+                raise ValueError(f"Sensor {sensor_id}: categorical splits cannot be packed")
+
+            lc = np.asarray(tree["left_children"], dtype=np.int32)
+            rc = np.asarray(tree["right_children"], dtype=np.int32)
+            is_leaf = lc == -1
+
+            roots.append(n_nodes)
+            tree_model.append(m)
+            feature.append(np.where(is_leaf, 0, to_column[np.asarray(tree["split_indices"], dtype=np.int32)]))
+            threshold.append(np.asarray(tree["split_conditions"], dtype=np.float32))
+            # Leaves point at themselves so the traversal can run a fixed number of steps
+            own = np.arange(len(lc), dtype=np.int32)
+            left.append(np.where(is_leaf, own, lc) + n_nodes)
+            right.append(np.where(is_leaf, own, rc) + n_nodes)
+            default_left.append(np.asarray(tree["default_left"], dtype=bool))
+            value.append(np.where(is_leaf, np.asarray(tree["split_conditions"], dtype=np.float32), 0).astype(np.float32))
+
+            n_nodes += len(lc)
+
+    left = np.concatenate(left).astype(np.int32)
+    right = np.concatenate(right).astype(np.int32)
+    roots = np.asarray(roots, dtype=np.int32)
+    tree_model = np.asarray(tree_model, dtype=np.int32)
+    tree_counts = np.bincount(tree_model, minlength=len(sensor_ids))
+
+    return {
+        "sensor_ids": sensor_ids,
+        "columns": columns,
+        "feature": np.concatenate(feature).astype(np.int32),
+        "threshold": np.concatenate(threshold),
+        "left": left,
+        "right": right,
+        "default_left": np.concatenate(default_left),
+        "value": np.concatenate(value),
+        "roots": roots,
+        "tree_start": np.concatenate([[0], np.cumsum(tree_counts)[:-1]]).astype(np.int64),
+        "tree_count": tree_counts.astype(np.int64),
+        "base_score": base_scores,
+        "max_depth": _max_depth(roots, left, right),
+    }
+
+
+def _max_depth(roots, left, right):
+    """Deepest leaf over all trees, walking every tree one level at a time."""
+    frontier = roots
+    depth = 0
+    while True:
+        inner = frontier[left[frontier] != frontier]
+        if len(inner) == 0:
+            return depth
+        frontier = np.concatenate([left[inner], right[inner]])
+        depth += 1
+
+
+def predict_packed(packed, X, sensor_ids):
+    """
+    Predict rows of X (columns in packed["columns"] order) in one traversal.
+
+    sensor_ids gives the model of every row; rows for different sensors and
+    several rows per sensor can be mixed freely.
+    """
+    X = np.asarray(X, dtype=np.float32)
+    model_pos = {sid: m for m, sid in enumerate(packed["sensor_ids"])}
+    row_model = np.array([model_pos[int(sid)] for sid in sensor_ids], dtype=np.int64)
+
+    # One (row, tree) pair for every tree of the row's model
+    counts = packed["tree_count"][row_model]
+    pair_row = np.repeat(np.arange(len(row_model)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    node = packed["roots"][np.repeat(packed["tree_start"][row_model], counts) + offsets]
+
+    for _ in range(packed["max_depth"]):
+        x = X[pair_row, packed["feature"][node]]
+        go_left = np.where(np.isnan(x), packed["default_left"][node], x < packed["threshold"][node])
+        node = np.where(go_left, packed["left"][node], packed["right"][node])
+
+    leaf_sum = np.bincount(pair_row, weights=packed["value"][node], minlength=len(row_model))
+    return (leaf_sum + packed["base_score"][row_model]).astype(np.float32)
+
+
+def feature_matrix(packed, frame):
+    """Reorder a frame's columns to packed["columns"] (missing columns become NaN)."""
+    return frame.reindex(columns=packed["columns"]).to_numpy(dtype=np.float32)
+
+
+def parity_check(packed, models, X, sensor_ids, atol=1e-3):
+    """
+    Compare predict_packed with each model's own predict on the same rows.
+
+    Returns the max absolute difference and warns when it is above atol
+    (XGBoost sums leaves in float32, so tiny differences are expected).
+    """
+    X = np.asarray(X, dtype=np.float32)
+    sensor_ids = np.asarray(sensor_ids)
+    packed_pred = predict_packed(packed, X, sensor_ids)
+
+    column_pos = {name: i for i, name in enumerate(packed["columns"])}
+    max_diff = 0.0
+    for sensor_id in np.unique(sensor_ids):
+        rows = sensor_ids == sensor_id
+        model = models[sensor_id] if sensor_id in models else models[str(sensor_id)]
+        cols = [column_pos[name] for name in model.get_booster().feature_names]
+        expected = model.predict(X[rows][:, cols])
+        max_diff = max(max_diff, float(np.abs(expected - packed_pred[rows]).max()))
+
+    if max_diff > atol:
+        print(f"⚠️ Packed forest differs from XGBoost by {max_diff:.2e} on {len(X)} rows (atol {atol:.0e})")
+    else:
+        print(f"✅ Packed forest matches XGBoost on {len(X)} rows (max |Δ| {max_diff:.2e})")
+    return max_diff
+
+
+def check_frame(packed, models, frame, atol=1e-3):
+    """
+    parity_check on the rows of frame (sensor_id + feature columns) whose
+    sensor is packed. Returns packed when it agrees with the models, else
+    None so the caller falls back to each model's own predict.
+    """
+    sensor_ids = frame["sensor_id"].astype(int)
+    rows = frame[sensor_ids.isin(packed["sensor_ids"])]
+    max_diff = parity_check(packed, models, feature_matrix(packed, rows), rows["sensor_id"].astype(int).to_numpy(), atol)
+    if max_diff > atol:
+        print("   Falling back to per-model predict")
+        return None
+    return packed
+
+
+def _models_key(versions):
+    return hashlib.sha256(json.dumps({str(k): str(v) for k, v in versions.items()}, sort_keys=True).encode()).hexdigest()
+
+
+def save_packed(packed, path, versions):
+    """Write packed arrays to an .npz, tagged with the model versions they came from."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    arrays = {k: v for k, v in packed.items() if isinstance(v, np.ndarray)}
+    tmp = path.with_suffix(".tmp.npz")
+    np.savez(
+        tmp,
+        **arrays,
+        sensor_ids=np.asarray(packed["sensor_ids"], dtype=np.int64),
+        columns=np.asarray(packed["columns"], dtype=str),
+        max_depth=packed["max_depth"],
+        key=_models_key(versions),
+    )
+    tmp.replace(path)
+    return path
+
+
+def load_packed(path, versions):
+    """Return the packed forest saved at path, or None if missing or built from other versions."""
+    path = Path(path)
+    if not path.exists():
+        return None
+    with np.load(path) as data:
+        if str(data["key"]) != _models_key(versions):
+            return None
+        packed = {k: data[k] for k in data.files if k not in ("sensor_ids", "columns", "max_depth", "key")}
+        packed["sensor_ids"] = data["sensor_ids"].tolist()
+        packed["columns"] = data["columns"].tolist()
+        packed["max_depth"] = int(data["max_depth"])
+    return packed
+
+
+def load_or_pack(models, versions, path):
+    """
+    Packed forest for models, reused from path while versions (sensor_id →
+    model version) are unchanged; otherwise packed again and saved.
+    """
+    start = time.perf_counter()
+    packed = load_packed(path, versions)
+    if packed is not None and set(packed["sensor_ids"]) == {int(sid) for sid in models}:
+        print(f"♻️ Loaded packed forest for {len(packed['sensor_ids'])} models ({time.perf_counter() - start:.2f}s)")
+        return packed
+
+    packed = pack_models(models)
+    save_packed(packed, path, versions)
+    print(
+        f"📦 Packed {len(packed['sensor_ids'])} models ({len(packed['roots'])} trees, "
+        f"{len(packed['feature'])} nodes) in {time.perf_counter() - start:.2f}s"
+    )
+    return packed
@@ -0,0 +1,453 @@
+import argparse
+import json
+import queue
+import threading
+import time
+import urllib.request
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from utils import backtest, inference, model_bundle, packed_forest
+
+
+HOST = "127.0.0.1"
+PORT = 8765
+
+MAX_BATCH = 512         # Feature rows merged into one predict call
+MAX_WAIT_MS = 2         # How long the batcher waits for more requests after the first
+LATENCY_WINDOW = 10000  # Recent request latencies kept for p50/p99
+REQUEST_TIMEOUT = 10    # Seconds a request waits for its batch
+
+SNAPSHOT_DIR = "cache/forecast"
+BATCH_DATA_FILE = "batch_data.parquet"
+LOCATIONS_FILE = "sensor_locations.json"
+
+
+def save_snapshot(batch_data, sensor_locations, snapshot_dir=SNAPSHOT_DIR):
+    """Store the inference inputs (recent observations + weather, locations) for the server."""
+    snapshot_dir = Path(snapshot_dir)
+    snapshot_dir.mkdir(parents=True, exist_ok=True)
+    batch_data.to_parquet(snapshot_dir / BATCH_DATA_FILE, index=False)
+    with open(snapshot_dir / LOCATIONS_FILE, "w") as f:
+        json.dump({str(sid): loc for sid, loc in sensor_locations.items()}, f, default=float)
+    return snapshot_dir
+
+
+def load_snapshot(snapshot_dir=SNAPSHOT_DIR):
+    """Return (batch_data, sensor_locations) written by save_snapshot."""
+    snapshot_dir = Path(snapshot_dir)
+    batch_data = pd.read_parquet(snapshot_dir / BATCH_DATA_FILE)
+    with open(snapshot_dir / LOCATIONS_FILE) as f:
+        sensor_locations = {int(sid): loc for sid, loc in json.load(f).items()}
+    return batch_data, sensor_locations
+
+
+class InvalidRequest(ValueError):
+    """A request body the server cannot use; answered with 400."""
+
+
+def _sensor_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise InvalidRequest(f"sensor_id must be an integer, got {value!r}") from None
+
+
+def parse_rows(rows, columns):
+    """
+    Validate ad-hoc feature rows before they are batched with other
+    requests: every row needs an integer sensor_id, and every feature in
+    columns must be a number or null (NaN). Other keys are ignored.
+    """
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        raise InvalidRequest("rows must be a list of objects")
+    parsed = []
+    for i, row in enumerate(rows):
+        clean = {"sensor_id": _sensor_id(row.get("sensor_id"))}
+        for column in columns:
+            value = row.get(column)
+            if value is None:
+                continue
+            try:
+                clean[column] = float(value)
+            except (TypeError, ValueError):
+                raise InvalidRequest(f"rows[{i}].{column} must be a number, got {value!r}") from None
+        parsed.append(clean)
+    return parsed
+
+
+def percentiles(seconds):
+    """p50/p99/max in milliseconds of a sequence of durations in seconds."""
+    if len(seconds) == 0:
+        return {"p50_ms": None, "p99_ms": None, "max_ms": None}
+    ms = np.asarray(seconds) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+
+class MicroBatcher:
+    """
+    Merge concurrent submissions into one batch_fn call.
+
+    submit(items) queues a list of items and returns a Future with their
+    results. A worker thread takes the first waiting submission, gathers
+    more for up to max_wait_ms (or until max_batch items), calls
+    batch_fn(all items) once and hands every submission its slice.
+    """
+
+    def __init__(self, batch_fn, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS):
+        self.batch_fn = batch_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.batch_sizes = deque(maxlen=LATENCY_WINDOW)
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(self, items):
+        future = Future()
+        self._queue.put((list(items), future))
+        return future
+
+    def _run(self):
+        while True:
+            pending = [self._queue.get()]
+            size = len(pending[0][0])
+            deadline = time.perf_counter() + self.max_wait
+            while size < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    pending.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+                size += len(pending[-1][0])
+
+            items = [item for submitted, _ in pending for item in submitted]
+            try:
+                results = self.batch_fn(items)
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+
+            self.batch_sizes.append(len(pending))
+            offset = 0
+            for submitted, future in pending:
+                future.set_result(results[offset:offset + len(submitted)])
+                offset += len(submitted)
+
+
+class ForecastService:
+    """
+    Models, recent feature state and the current forecast, held in memory.
+
+    The 7-day forecast for every sensor is computed once per state update with
+    the inference engine; sensor_id requests read from it. With snapshot_dir,
+    the forecast is recomputed when the snapshot files change on disk or the
+    date rolls over (unless today was given), checked on every forecast
+    request. Ad-hoc feature rows go through a MicroBatcher, so concurrent
+    requests share one packed forest traversal.
+    """
+
+    def __init__(
+        self,
+        models,
+        sensor_locations,
+        batch_data,
+        packed=None,
+        today=None,
+        horizons=backtest.HORIZONS,
+        max_batch=MAX_BATCH,
+        max_wait_ms=MAX_WAIT_MS,
+        snapshot_dir=None,
+    ):
+        self.models = models
+        self.sensor_locations = sensor_locations
+        self.packed = packed if packed is not None else packed_forest.pack_models(models)
+        self.horizons = horizons
+        self.snapshot_dir = Path(snapshot_dir) if snapshot_dir is not None else None
+        self.fixed_today = today is not None
+        self.reloads = 0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._latencies = {"forecast": deque(maxlen=LATENCY_WINDOW), "rows": deque(maxlen=LATENCY_WINDOW)}
+        self._snapshot_version = self._read_snapshot_version()
+        self.update(batch_data, today)
+        self.batcher = MicroBatcher(self._predict_rows, max_batch=max_batch, max_wait_ms=max_wait_ms)
+
+    def update(self, batch_data, today=None):
+        """Recompute the forecast from new inputs and swap it in."""
+        today = pd.Timestamp(today or date.today())
+        forecast_days = [today + pd.Timedelta(days=i) for i in range(self.horizons)]
+        predictions, _ = inference.run_forecast(
+            batch_data, self.models, self.sensor_locations, forecast_days, today, packed=self.packed
+        )
+        predictions = predictions.assign(date=predictions["date"].dt.strftime("%Y-%m-%d"))
+        by_sensor = {
+            int(sid): group.drop(columns="sensor_id").to_dict(orient="records")
+            for sid, group in predictions.groupby("sensor_id")
+        }
+        with self._lock:
+            self.today = today
+            self._batch_data = batch_data
+            self._forecasts = by_sensor
+
+    def _read_snapshot_version(self):
+        if self.snapshot_dir is None:
+            return None
+        try:
+            return tuple((self.snapshot_dir / name).stat().st_mtime_ns for name in (BATCH_DATA_FILE, LOCATIONS_FILE))
+        except OSError:
+            return None
+
+    def refresh(self, force=False):
+        """
+        Reload the snapshot if it changed on disk and recompute the forecast
+        if anything (snapshot or date) changed, or always with force.
+        Without force, a refresh already running in another thread is not
+        waited for. Returns True when the forecast was recomputed.
+        """
+        if not self._refresh_lock.acquire(blocking=force):
+            return False
+        try:
+            version = self._read_snapshot_version()
+            snapshot_changed = version is not None and version != self._snapshot_version
+            new_day = not self.fixed_today and pd.Timestamp(date.today()) != self.today
+            if not (force or snapshot_changed or new_day):
+                return False
+
+            batch_data = self._batch_data
+            if version is not None:
+                batch_data, self.sensor_locations = load_snapshot(self.snapshot_dir)
+            self._snapshot_version = version
+            self.update(batch_data, self.today if self.fixed_today else None)
+            self.reloads += 1
+            return True
+        finally:
+            self._refresh_lock.release()
+
+    def forecast(self, sensor_ids):
+        """Return ({sensor_id: [day rows]}, [unknown sensor_ids])."""
+        if not isinstance(sensor_ids, list):
+            raise InvalidRequest("sensor_ids must be a list")
+        ids = [_sensor_id(sid) for sid in sensor_ids]
+        self.refresh()
+        with self._lock:
+            forecasts = self._forecasts
+        found = {sid: forecasts[sid] for sid in ids if sid in forecasts}
+        return found, [sid for sid in ids if sid not in forecasts]
+
+    def _predict_rows(self, rows):
+        X = packed_forest.feature_matrix(self.packed, pd.DataFrame(rows))
+        return packed_forest.predict_packed(self.packed, X, [row["sensor_id"] for row in rows]).tolist()
+
+    def predict_rows(self, rows):
+        """
+        Predict ad-hoc feature rows ({"sensor_id": ..., feature: value, ...}); missing features are NaN.
+        Rows are validated first (InvalidRequest), so a bad row never reaches a shared batch.
+        """
+        rows = parse_rows(rows, self.packed["columns"])
+        known = set(self.packed["sensor_ids"])
+        unknown = [row["sensor_id"] for row in rows if row["sensor_id"] not in known]
+        if unknown:
+            raise KeyError(f"No model for sensors {unknown}")
+        return self.batcher.submit(rows).result(timeout=REQUEST_TIMEOUT)
+
+    def record(self, kind, seconds):
+        self._latencies[kind].append(seconds)
+
+    def stats(self):
+        batch_sizes = list(self.batcher.batch_sizes)
+        return {
+            "today": str(self.today.date()),
+            "sensors": len(self._forecasts),
+            "reloads": self.reloads,
+            **{
+                kind: {"requests": len(latencies), **percentiles(list(latencies))}
+                for kind, latencies in self._latencies.items()
+            },
+            "batches": len(batch_sizes),
+            "mean_requests_per_batch": round(float(np.mean(batch_sizes)), 2) if batch_sizes else None,
+        }
+
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status, payload):
+            body = json.dumps(payload, default=float).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path == "/stats":
+                self._send(200, service.stats())
+            elif self.path == "/health":
+                self._send(200, {"status": "ok"})
+            else:
+                self._send(404, {"error": f"Unknown path {self.path}"})
+
+        def do_POST(self):
+            if self.path == "/reload":
+                # Pick up a new snapshot (or date) now instead of on the next forecast request
+                try:
+                    service.refresh(force=True)
+                except Exception as e:
+                    self._send(500, {"error": f"{type(e).__name__}: {e}"})
+                    return
+                self._send(200, {"today": str(service.today.date()), "reloads": service.reloads})
+                return
+            if self.path != "/forecast":
+                self._send(404, {"error": f"Unknown path {self.path}"})
+                return
+
+            start = time.perf_counter()
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            except (json.JSONDecodeError, UnicodeDecodeError, ValueError) as e:
+                self._send(400, {"error": f"Invalid JSON: {e}"})
+                return
+            if not isinstance(request, dict):
+                self._send(400, {"error": "Body must be a JSON object"})
+                return
+
+            if "rows" in request:
+                kind = "rows"
+                call = lambda: {"predictions": service.predict_rows(request["rows"])}
+            elif "sensor_ids" in request:
+                kind = "forecast"
+                call = lambda: dict(zip(("forecasts", "unknown"), service.forecast(request["sensor_ids"])))
+            else:
+                self._send(400, {"error": "Body must contain sensor_ids or rows"})
+                return
+
+            try:
+                payload = call()
+            except InvalidRequest as e:
+                self._send(400, {"error": str(e)})
+                return
+            except KeyError as e:
+                self._send(404, {"error": str(e.args[0])})
+                return
+            except Exception as e:
+                self._send(500, {"error": f"{type(e).__name__}: {e}"})
+                return
+            service.record(kind, time.perf_counter() - start)
+            self._send(200, payload)
+
+    return Handler
+
+
+class PredictionHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256  # The default backlog of 5 resets connections under concurrent load
+
+
+def serve(service, host=HOST, port=PORT):
+    """Start the HTTP server on a background thread and return it (server.shutdown() stops it)."""
+    server = PredictionHTTPServer((host, port), make_handler(service))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"✅ Prediction server on http://{host}:{server.server_address[1]} ({len(service.packed['sensor_ids'])} models)")
+    return server
+
+
+def load_test(url, payloads, n_requests=2000, concurrency=32):
+    """
+    Fire n_requests POST /forecast requests (cycling through payloads) from
+    `concurrency` threads. Returns client-side latency percentiles and throughput.
+    """
+    def post(payload):
+        body = json.dumps(payload).encode()
+        request = urllib.request.Request(f"{url}/forecast", data=body, headers={"Content-Type": "application/json"})
+        start = time.perf_counter()
+        with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+            response.read()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(post, (payloads[i % len(payloads)] for i in range(n_requests))))
+    elapsed = time.perf_counter() - start
+
+    report = {"requests": n_requests, "concurrency": concurrency, "rps": round(n_requests / elapsed, 1), **percentiles(latencies)}
+    print(
+        f"📊 {n_requests} requests × {concurrency} clients: {report['rps']} req/s, "
+        f"p50 {report['p50_ms']} ms, p99 {report['p99_ms']} ms"
+    )
+    return report
+
+
+def load_service(bundle_path, snapshot_dir=SNAPSHOT_DIR, packed_path=None, **service_kwargs):
+    """Build a ForecastService from a model bundle and an inference snapshot."""
+    bundle = model_bundle.ModelBundle(bundle_path)
+    batch_data, sensor_locations = load_snapshot(snapshot_dir)
+    packed = None
+    if packed_path is not None:
+        versions = {sid: bundle.entry(sid).get("version") for sid in bundle}
+        packed = packed_forest.load_or_pack(bundle, versions, packed_path)
+    return ForecastService(bundle, sensor_locations, batch_data, packed=packed, snapshot_dir=snapshot_dir, **service_kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve PM2.5 forecasts from in-memory models.")
+    parser.add_argument("--bundle", default=f"cache/{model_bundle.BUNDLE_FILE}")
+    parser.add_argument("--snapshot-dir", default=SNAPSHOT_DIR)
+    parser.add_argument("--packed", default="cache/models/packed_forest.npz")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS)
+    parser.add_argument("--load-test", type=int, default=0, metavar="N", help="run N requests against the server and exit")
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    service = load_service(
+        args.bundle, args.snapshot_dir, args.packed, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms
+    )
+    server = serve(service, args.host, args.port)
+    url = f"http://{args.host}:{server.server_address[1]}"
+
+    if args.load_test:
+        batch_data, _ = load_snapshot(args.snapshot_dir)
+        rows = (
+            batch_data[batch_data["sensor_id"].isin(service.packed["sensor_ids"])]
+            .reindex(columns=["sensor_id", *service.packed["columns"]])
+            .dropna(subset=["sensor_id"])
+            .tail(1000)
+        )
+        rows = [
+            {k: v for k, v in row.items() if pd.notna(v)}
+            for row in rows.astype({"sensor_id": int}).to_dict(orient="records")
+        ]
+        sensor_ids = [int(sid) for sid in service.packed["sensor_ids"]]
+        load_test(url, [{"rows": [row]} for row in rows], args.load_test, args.concurrency)
+        load_test(url, [{"sensor_ids": sensor_ids[i:i + 5]} for i in range(0, len(sensor_ids), 5)], args.load_test, args.concurrency)
+        print(json.dumps(service.stats(), indent=2))
+        server.shutdown()
+        return
+
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        print(json.dumps(service.stats(), indent=2))
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
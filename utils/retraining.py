@@ -0,0 +1,246 @@
+import json
+import time
+from pathlib import Path
+
+import pandas as pd
+from sklearn.metrics import mean_squared_error, r2_score
+from xgboost import XGBRegressor
+
+from utils import model_cache, training, training_cache
+
+
+MODEL_NAME_TEMPLATE = "air_quality_xgboost_model_{sensor_id}"
+STATE_FILE = "training_state.json"
+
+HOLDOUT_DAYS = 14           # Rolling holdout: most recent rows, never boosted on
+UPDATE_ROUNDS = 10          # Trees added per warm start
+DRIFT_RATIO = 1.5           # Refit if the previous model's holdout MSE exceeds its reference MSE by this factor
+REGRESSION_TOLERANCE = 0.05 # Refit if the warm-started model is >5% worse than the previous one on the holdout
+MAX_TOTAL_ROUNDS = 400      # Refit once continuation has grown the booster this far
+
+
+def save_model(model, sensor_dir, feature_name, last_train_date, reference_mse, warm_starts=0):
+    """
+    Save model.json plus the training state needed to warm-start it later.
+
+    reference_mse is the test MSE of the last full fit; drift is measured
+    against it.
+    """
+    sensor_dir = Path(sensor_dir)
+    sensor_dir.mkdir(parents=True, exist_ok=True)
+    model.save_model(sensor_dir / "model.json")
+
+    state = {
+        "feature_name": feature_name,
+        "feature_names": model.get_booster().feature_names,
+        "last_train_date": pd.Timestamp(last_train_date).isoformat(),
+        "reference_mse": float(reference_mse),
+        "num_boosted_rounds": int(model.get_booster().num_boosted_rounds()),
+        "warm_starts": int(warm_starts),
+    }
+    with open(sensor_dir / STATE_FILE, "w") as f:
+        json.dump(state, f, indent=2)
+
+    return state
+
+
+def load_state(model_dir):
+    state_path = Path(model_dir) / STATE_FILE
+    if not state_path.exists():
+        return None
+    with open(state_path) as f:
+        return json.load(f)
+
+
+def load_registered_models(mr, sensor_ids, model_cache_dir):
+    """
+    Fetch the latest registered model of every sensor through the local
+    model cache (parallel downloads, unchanged versions are not downloaded
+    again).
+
+    Returns dict: sensor_id → (XGBRegressor, state); sensors without a
+    registered model are left out. state is None for models registered
+    before training state was saved.
+    """
+    names = {sensor_id: MODEL_NAME_TEMPLATE.format(sensor_id=sensor_id) for sensor_id in sensor_ids}
+    fetched = model_cache.fetch_models(mr, list(names.values()), model_cache_dir)
+    return {
+        sensor_id: (fetched[name][1], load_state(fetched[name][2]))
+        for sensor_id, name in names.items()
+        if name in fetched
+    }
+
+
+def _score(model, X, y):
+    pred = model.predict(X)
+    return pred, r2_score(y, pred), mean_squared_error(y, pred)
+
+
+def _refit(reason):
+    return {"status": "refit", "reason": reason}
+
+
+def warm_start_sensor(
+    df,
+    prev_model,
+    state,
+    xgb_params,
+    holdout_days=HOLDOUT_DAYS,
+    update_rounds=UPDATE_ROUNDS,
+    drift_ratio=DRIFT_RATIO,
+    regression_tolerance=REGRESSION_TOLERANCE,
+    max_total_rounds=MAX_TOTAL_ROUNDS,
+    min_test_rows=training.MIN_TEST_ROWS,
+    target=training.TARGET,
+    n_jobs=None,
+):
+    """
+    Continue boosting prev_model on the rows that arrived since it was trained.
+
+    The most recent holdout_days rows form a rolling holdout; only older rows
+    newer than state["last_train_date"] are boosted on. Returns a dict whose
+    status is "warm_start", "unchanged" (nothing new to learn) or "refit"
+    (drift or validation regression, with a reason).
+    """
+    feature_cols = prev_model.get_booster().feature_names
+    if any(c not in df.columns for c in feature_cols):
+        return _refit("feature set changed")
+
+    holdout = df.iloc[-holdout_days:]
+    history = df.iloc[:-holdout_days]
+    if len(holdout) < min_test_rows or history.empty:
+        return _refit("too few rows for a holdout")
+
+    last_train_date = pd.Timestamp(state["last_train_date"])
+    update = history[history["date"] > last_train_date]
+
+    X_holdout = holdout[feature_cols]
+    y_holdout = holdout[target]
+    prev_pred, prev_r2, prev_mse = _score(prev_model, X_holdout, y_holdout)
+
+    if prev_mse > drift_ratio * state["reference_mse"]:
+        return _refit(f"drift (holdout MSE {prev_mse:.2f} vs reference {state['reference_mse']:.2f})")
+
+    result = {
+        "feature_name": state["feature_name"],
+        "R2": prev_r2,
+        "MSE": prev_mse,
+        "train_size": len(update),
+        "test_size": len(holdout),
+        "last_train_date": last_train_date,
+        "reference_mse": state["reference_mse"],
+        "warm_starts": state.get("warm_starts", 0),
+    }
+
+    if update.empty:
+        return {"status": "unchanged", "model": prev_model, "y_pred": prev_pred, "result": result}
+
+    if prev_model.get_booster().num_boosted_rounds() + update_rounds > max_total_rounds:
+        return _refit("booster reached max_total_rounds")
+
+    # Same booster settings as the full fit; anything the previous model
+    # still carries (a model loaded from model.json carries little) wins
+    params = {"objective": "reg:squarederror", "tree_method": "hist", "learning_rate": xgb_params["learning_rate"]}
+    params.update({key: value for key, value in prev_model.get_xgb_params().items() if value is not None})
+    params.update(n_estimators=update_rounds, n_jobs=n_jobs)
+    model = XGBRegressor(**params)
+    model.fit(update[feature_cols], update[target], xgb_model=prev_model.get_booster())
+    pred, r2, mse = _score(model, X_holdout, y_holdout)
+
+    if mse > prev_mse * (1 + regression_tolerance):
+        return _refit(f"validation regression (holdout MSE {mse:.2f} vs {prev_mse:.2f})")
+
+    result.update({
+        "R2": r2,
+        "MSE": mse,
+        "last_train_date": update["date"].max(),
+        "warm_starts": result["warm_starts"] + 1,
+    })
+    return {"status": "warm_start", "model": model, "y_pred": pred, "result": result}
+
+
+def run_incremental(
+    mr,
+    partitions,
+    xgb_params,
+    model_cache_dir,
+    max_workers=None,
+    warm_start_kwargs=None,
+    cache_dir=None,
+    **task_kwargs,
+):
+    """
+    Warm-start every sensor from its registered model and fully retrain
+    (across all feature sets) only the sensors that need it.
+
+    Returns (models, y_preds, results) like training.run_training; each
+    result row carries a `mode` of "warm_start", "unchanged" or "full".
+    Registered models are fetched through the model cache in
+    model_cache_dir; full refits go through the training cache when
+    cache_dir is given.
+    """
+    warm_start_kwargs = warm_start_kwargs or {}
+    models = {}
+    y_preds = {}
+    results = []
+    refit_reasons = {}
+
+    sensor_ids = sorted(set().union(*(frames.keys() for frames in partitions.values())))
+    start = time.perf_counter()
+    registered = load_registered_models(mr, sensor_ids, model_cache_dir)
+
+    for idx, sensor_id in enumerate(sensor_ids, start=1):
+        prev_model, state = registered.get(sensor_id, (None, None))
+        if prev_model is None:
+            refit_reasons[sensor_id] = "no registered model"
+            continue
+        if state is None:
+            refit_reasons[sensor_id] = "no training state"
+            continue
+
+        df = partitions.get(state["feature_name"], {}).get(sensor_id)
+        if df is None:
+            refit_reasons[sensor_id] = "no data for registered feature set"
+            continue
+
+        output = warm_start_sensor(df, prev_model, state, xgb_params, **warm_start_kwargs)
+        if output["status"] == "refit":
+            refit_reasons[sensor_id] = output["reason"]
+            print(f"[{idx}/{len(sensor_ids)}] Sensor {sensor_id}: full refit ({output['reason']})")
+            continue
+
+        row = {**output["result"], "sensor_id": sensor_id, "mode": output["status"]}
+        feature_name = row["feature_name"]
+        models.setdefault(feature_name, {})[sensor_id] = output["model"]
+        y_preds.setdefault(feature_name, {})[sensor_id] = output["y_pred"]
+        results.append(row)
+
+    warm_count = sum(row["mode"] == "warm_start" for row in results)
+    unchanged_count = len(results) - warm_count
+    print(
+        f"\n✅ Incremental pass: {warm_count} warm-started, {unchanged_count} unchanged, "
+        f"{len(refit_reasons)} need a full refit ({time.perf_counter() - start:.1f}s)"
+    )
+
+    if refit_reasons:
+        tasks = [
+            (feature_name, sensor_id)
+            for feature_name, frames in partitions.items()
+            for sensor_id in refit_reasons
+            if sensor_id in frames
+        ]
+        if cache_dir is not None:
+            refit_models, refit_preds, refit_results = training_cache.run_training(
+                partitions, xgb_params, cache_dir, max_workers=max_workers, tasks=tasks, **task_kwargs
+            )
+        else:
+            refit_models, refit_preds, refit_results = training.run_training(
+                partitions, xgb_params, max_workers=max_workers, tasks=tasks, **task_kwargs
+            )
+        for feature_name, sensor_models in refit_models.items():
+            models.setdefault(feature_name, {}).update(sensor_models)
+            y_preds.setdefault(feature_name, {}).update(refit_preds[feature_name])
+        for row in refit_results:
+            results.append({**row, "mode": "full", "reference_mse": row["MSE"], "warm_starts": 0})
+
+    return models, y_preds, results
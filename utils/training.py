@@ -0,0 +1,294 @@
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import xgboost as xgb
+from sklearn.metrics import mean_squared_error, r2_score
+from xgboost import XGBRegressor
+
+
+TARGET = "pm25"
+
+TRAIN_RATIO = 0.8
+MIN_ROWS = 10
+MIN_TEST_ROWS = 2
+
+N_RESTARTS = 5
+BASE_SEED = 165439
+
+EXCLUDE_COLS = [
+    "pm25", "date", "sensor_id", "city", "street", "country",
+    "latitude", "longitude", "aqicn_url"
+]
+
+# Worker-local state, set once per process by the pool initializer
+_PARTITIONS = {}
+_NTHREAD = 1
+
+
+def feature_columns(df, exclude_cols=EXCLUDE_COLS):
+    return [c for c in df.columns if c not in exclude_cols]
+
+
+def partition_by_sensor(df, target=TARGET):
+    """
+    Split a feature frame into per-sensor frames in a single groupby pass.
+
+    Rows without a target are dropped and each partition is sorted by date so
+    the train/test split is time-ordered.
+    """
+    df = df.dropna(subset=[target]).sort_values(["sensor_id", "date"])
+    return {
+        sensor_id: group.reset_index(drop=True)
+        for sensor_id, group in df.groupby("sensor_id", sort=False)
+    }
+
+
+def partition_feature_data(feature_data_cache, target=TARGET):
+    """Return dict: feature_name → {sensor_id → DataFrame}"""
+    return {
+        feature_name: partition_by_sensor(df, target=target)
+        for feature_name, df in feature_data_cache.items()
+    }
+
+
+def build_tasks(partitions):
+    """Return the (feature_name, sensor_id) task grid."""
+    return [
+        (feature_name, sensor_id)
+        for feature_name, sensor_frames in partitions.items()
+        for sensor_id in sensor_frames
+    ]
+
+
+def _init_worker(partitions, nthread):
+    global _PARTITIONS, _NTHREAD
+    _PARTITIONS = partitions
+    _NTHREAD = nthread
+
+
+def worker_partitions():
+    """The partitions of this training worker, for task_fn implementations."""
+    return _PARTITIONS
+
+
+def worker_nthread():
+    """XGBoost threads per task in this training worker."""
+    return _NTHREAD
+
+
+def build_dmatrices(train_df, eval_df, feature_cols, target=TARGET, nthread=None):
+    """
+    Return (dtrain, deval) QuantileDMatrix pair for one split.
+
+    The eval matrix reuses the train matrix's quantile sketch (ref=dtrain), so
+    the sketch is computed once and both splits share the same histogram bins.
+    """
+    dtrain = xgb.QuantileDMatrix(train_df[feature_cols], label=train_df[target], nthread=nthread)
+    deval = xgb.QuantileDMatrix(eval_df[feature_cols], label=eval_df[target], ref=dtrain, nthread=nthread)
+    return dtrain, deval
+
+
+def to_regressor(booster):
+    """Wrap a trained Booster in an XGBRegressor (for save_model, predict on frames, etc.)."""
+    model = XGBRegressor()
+    model.load_model(bytearray(booster.save_raw("json")))
+    return model
+
+
+def fit_best_of_n(dtrain, dtest, xgb_params, n_restarts=N_RESTARTS, base_seed=BASE_SEED, n_jobs=None):
+    """
+    Fit n_restarts models on one prebuilt DMatrix pair and keep the one with
+    the best test R2.
+
+    Returns (model, pred, r2, mse, boost_seconds).
+    """
+    best_booster = None
+    best_pred = None
+    best_r2 = -1e9
+    best_mse = 1e9
+    y_test = dtest.get_label()
+
+    start = time.perf_counter()
+    for i in range(n_restarts):
+        booster = xgb.train(
+            {
+                "objective": "reg:squarederror",
+                "tree_method": "hist",
+                "eta": xgb_params["learning_rate"],
+                "seed": base_seed * i,
+                "nthread": n_jobs,
+            },
+            dtrain,
+            num_boost_round=xgb_params["n_estimators"],
+        )
+        pred = booster.predict(dtest)
+        r2 = r2_score(y_test, pred)
+        mse = mean_squared_error(y_test, pred)
+
+        if r2 > best_r2:
+            best_r2 = r2
+            best_mse = mse
+            best_booster = booster
+            best_pred = pred
+
+    return to_regressor(best_booster), best_pred, best_r2, best_mse, time.perf_counter() - start
+
+
+def train_task(
+    feature_name,
+    sensor_id,
+    xgb_params,
+    n_restarts=N_RESTARTS,
+    base_seed=BASE_SEED,
+    train_ratio=TRAIN_RATIO,
+    min_rows=MIN_ROWS,
+    min_test_rows=MIN_TEST_ROWS,
+    target=TARGET,
+    exclude_cols=EXCLUDE_COLS,
+):
+    """
+    Train the best-of-N model for one (feature_name, sensor_id) task.
+
+    The train/test matrices are built once and shared by every restart; the
+    result row records the time spent converting data vs boosting.
+
+    Returns a dict with the `result` row, the fitted `model` and its test
+    predictions `y_pred`, or None if the sensor has too little data.
+    """
+    df = _PARTITIONS[feature_name].get(sensor_id)
+    if df is None or len(df) < min_rows:
+        return None
+
+    feature_cols = feature_columns(df, exclude_cols)
+
+    train_size = int(train_ratio * len(df))
+    train_df = df.iloc[:train_size]
+    test_df = df.iloc[train_size:]
+
+    if len(test_df) < min_test_rows:
+        return None
+
+    start = time.perf_counter()
+    dtrain, dtest = build_dmatrices(train_df, test_df, feature_cols, target, nthread=_NTHREAD)
+    convert_seconds = time.perf_counter() - start
+
+    best_model, best_pred, best_r2, best_mse, boost_seconds = fit_best_of_n(
+        dtrain,
+        dtest,
+        xgb_params,
+        n_restarts=n_restarts,
+        base_seed=base_seed,
+        n_jobs=_NTHREAD,
+    )
+
+    return {
+        "result": {
+            "feature_name": feature_name,
+            "sensor_id": sensor_id,
+            "R2": best_r2,
+            "MSE": best_mse,
+            "train_size": len(train_df),
+            "test_size": len(test_df),
+            "last_train_date": train_df["date"].max(),
+            "convert_seconds": convert_seconds,
+            "boost_seconds": boost_seconds,
+        },
+        "model": best_model,
+        "y_pred": best_pred,
+    }
+
+
+def iter_training_results(partitions, xgb_params, max_workers=None, tasks=None, task_fn=None, **task_kwargs):
+    """
+    Run training tasks across a process pool and yield each output as soon
+    as it completes.
+
+    Every worker receives the partitions once at start-up and trains with
+    cpu_count // max_workers threads so the pool does not oversubscribe.
+    task_fn(*task, xgb_params, **task_kwargs) runs each task (default
+    train_task); it must be a module-level function so workers can import it.
+    """
+    if tasks is None:
+        tasks = build_tasks(partitions)
+    task_fn = task_fn or train_task
+
+    cpu_count = os.cpu_count() or 1
+    max_workers = max(1, min(max_workers or cpu_count, len(tasks) or 1))
+    nthread = max(1, cpu_count // max_workers)
+
+    if max_workers == 1:
+        _init_worker(partitions, nthread)
+        for task in tasks:
+            output = task_fn(*task, xgb_params, **task_kwargs)
+            if output is not None:
+                yield output
+        return
+
+    # Spawn instead of fork: forking after XGBoost has started its OpenMP
+    # thread pool (e.g. earlier in the notebook) can deadlock the workers.
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(partitions, nthread),
+    ) as pool:
+        futures = [pool.submit(task_fn, *task, xgb_params, **task_kwargs) for task in tasks]
+        for future in as_completed(futures):
+            output = future.result()
+            if output is not None:
+                yield output
+
+
+def print_profile(results):
+    """Print the data conversion vs boosting time summed over the result rows."""
+    convert = sum(row.get("convert_seconds", 0.0) for row in results)
+    boost = sum(row.get("boost_seconds", 0.0) for row in results)
+    if convert + boost > 0:
+        print(
+            f"⏱️ Data conversion {convert:.1f}s vs boosting {boost:.1f}s "
+            f"({convert / (convert + boost):.0%} conversion, summed across workers)"
+        )
+
+
+def run_training(partitions, xgb_params, max_workers=None, log_every=10, tasks=None, task_fn=None, **task_kwargs):
+    """
+    Train every (feature_name, sensor_id) task and collect the outputs.
+
+    Returns (models, y_preds, results) in the same shape as the training
+    notebook containers: models[feature_name][sensor_id], etc. Pass tasks to
+    train only part of the grid, or task_fn to run a different task function
+    whose outputs have the same shape.
+    """
+    models = {}
+    y_preds = {}
+    results = []
+
+    if tasks is None:
+        tasks = build_tasks(partitions)
+    total = len(tasks)
+    start = time.perf_counter()
+
+    for idx, output in enumerate(
+        iter_training_results(
+            partitions, xgb_params, max_workers=max_workers, tasks=tasks, task_fn=task_fn, **task_kwargs
+        ),
+        start=1,
+    ):
+        row = output["result"]
+        feature_name, sensor_id = row["feature_name"], row["sensor_id"]
+
+        models.setdefault(feature_name, {})[sensor_id] = output["model"]
+        y_preds.setdefault(feature_name, {})[sensor_id] = output["y_pred"]
+        results.append(row)
+
+        if idx % log_every == 0:
+            print(f"[{idx}/{total}] Trained {feature_name} / sensor {sensor_id}: R²={row['R2']:.3f}, MSE={row['MSE']:.2f}")
+
+    elapsed = time.perf_counter() - start
+    print(f"\n✅ Training complete: {len(results)}/{total} models trained in {elapsed:.1f}s")
+    print_profile(results)
+
+    return models, y_preds, results
@@ -0,0 +1,202 @@
+import hashlib
+import json
+import shutil
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import xgboost
+from xgboost import XGBRegressor
+
+from utils import training
+
+
+REGISTERED_FILE = "registered.json"
+
+
+def code_version():
+    """Hash of the training engine source and the XGBoost version."""
+    source = Path(training.__file__).read_bytes()
+    return hashlib.sha256(source + xgboost.__version__.encode()).hexdigest()[:16]
+
+
+def task_fingerprint(df, feature_name, xgb_params, task_kwargs=None, version=None):
+    """Fingerprint of (sensor rows, feature set, xgb params, code version)."""
+    h = hashlib.sha256()
+    h.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    h.update(json.dumps(
+        {
+            "columns": list(df.columns),
+            "feature_name": feature_name,
+            "xgb_params": xgb_params,
+            "task_kwargs": task_kwargs or {},
+            "code_version": version or code_version(),
+        },
+        sort_keys=True,
+        default=str,
+    ).encode())
+    return h.hexdigest()
+
+
+def load_output(cache_dir, fingerprint):
+    """Return the cached task output, or None on a cache miss."""
+    entry_dir = Path(cache_dir) / fingerprint
+    result_path = entry_dir / "result.json"
+    if not result_path.exists():
+        return None
+
+    with open(result_path) as f:
+        result = json.load(f)
+    result["last_train_date"] = pd.Timestamp(result["last_train_date"])
+
+    model = XGBRegressor()
+    model.load_model(entry_dir / "model.json")
+
+    return {
+        "result": result,
+        "model": model,
+        "y_pred": np.load(entry_dir / "y_pred.npy"),
+    }
+
+
+def store_output(cache_dir, fingerprint, output):
+    entry_dir = Path(cache_dir) / fingerprint
+    entry_dir.mkdir(parents=True, exist_ok=True)
+
+    output["model"].save_model(entry_dir / "model.json")
+    np.save(entry_dir / "y_pred.npy", np.asarray(output["y_pred"]))
+
+    # result.json is written last so a partial entry is never treated as a hit
+    result = {
+        **output["result"],
+        "last_train_date": pd.Timestamp(output["result"]["last_train_date"]).isoformat(),
+    }
+    with open(entry_dir / "result.json", "w") as f:
+        json.dump(result, f, indent=2, default=lambda v: v.item() if hasattr(v, "item") else str(v))
+
+
+def run_training(partitions, xgb_params, cache_dir, max_workers=None, tasks=None, **task_kwargs):
+    """
+    training.run_training that skips tasks whose fingerprint is already cached.
+
+    Cached tasks reuse the stored model and metrics. Every result row gets
+    its `fingerprint` and a `cached` flag.
+    """
+    if tasks is None:
+        tasks = training.build_tasks(partitions)
+
+    version = code_version()
+    fingerprints = {
+        (feature_name, sensor_id): task_fingerprint(
+            partitions[feature_name][sensor_id], feature_name, xgb_params, task_kwargs, version
+        )
+        for feature_name, sensor_id in tasks
+    }
+
+    models = {}
+    y_preds = {}
+    results = []
+    misses = []
+
+    for task in tasks:
+        output = load_output(cache_dir, fingerprints[task])
+        if output is None:
+            misses.append(task)
+            continue
+
+        feature_name, sensor_id = task
+        models.setdefault(feature_name, {})[sensor_id] = output["model"]
+        y_preds.setdefault(feature_name, {})[sensor_id] = output["y_pred"]
+        results.append({**output["result"], "sensor_id": sensor_id, "fingerprint": fingerprints[task], "cached": True})
+
+    print(f"♻️ Training cache: {len(results)}/{len(tasks)} tasks unchanged, {len(misses)} to train")
+
+    if misses:
+        start = time.perf_counter()
+        for output in training.iter_training_results(
+            partitions, xgb_params, max_workers=max_workers, tasks=misses, **task_kwargs
+        ):
+            row = output["result"]
+            task = (row["feature_name"], row["sensor_id"])
+            store_output(cache_dir, fingerprints[task], output)
+
+            models.setdefault(task[0], {})[task[1]] = output["model"]
+            y_preds.setdefault(task[0], {})[task[1]] = output["y_pred"]
+            results.append({**row, "fingerprint": fingerprints[task], "cached": False})
+
+        print(f"✅ Trained {len(misses)} tasks in {time.perf_counter() - start:.1f}s")
+        training.print_profile([row for row in results if not row["cached"]])
+
+    return models, y_preds, results
+
+
+def prune(cache_dir, results):
+    """
+    Delete the cached task entries that neither this run's results nor the
+    registered-model ledger refer to, so the cache holds one run's worth of
+    tasks instead of growing with every retrain. Returns the number removed.
+    """
+    cache_dir = Path(cache_dir)
+    if not cache_dir.exists():
+        return 0
+    keep = {row["fingerprint"] for row in results if isinstance(row.get("fingerprint"), str)}
+    keep |= {entry["fingerprint"] for entry in load_registered(cache_dir).values()}
+
+    removed = 0
+    freed = 0
+    for entry_dir in cache_dir.iterdir():
+        if not entry_dir.is_dir() or entry_dir.name in keep:
+            continue
+        freed += sum(f.stat().st_size for f in entry_dir.iterdir())
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        removed += 1
+    if removed:
+        print(f"♻️ Training cache: removed {removed} stale tasks ({freed / 1e6:.1f} MB), kept {len(keep)}")
+    return removed
+
+
+def load_registered(cache_dir):
+    """
+    Return dict: sensor_id (str) → {"fingerprint", "version", "checksum"} of
+    the model this pipeline last uploaded for the sensor.
+    """
+    path = Path(cache_dir) / REGISTERED_FILE
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        registered = json.load(f)
+    # Older ledgers stored the bare fingerprint; without a version they never match
+    return {
+        sensor_id: entry if isinstance(entry, dict) else {"fingerprint": entry, "version": None, "checksum": None}
+        for sensor_id, entry in registered.items()
+    }
+
+
+def mark_registered(cache_dir, sensor_id, fingerprint, version=None, checksum=None):
+    """
+    Record the upload of a sensor's model. Uploads without a fingerprint
+    (warm-started or halving models) drop the sensor's entry, so an older
+    fingerprint can no longer match a model that was since replaced.
+    """
+    registered = load_registered(cache_dir)
+    if isinstance(fingerprint, str):
+        registered[str(sensor_id)] = {"fingerprint": fingerprint, "version": version, "checksum": checksum}
+    else:
+        registered.pop(str(sensor_id), None)
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    with open(Path(cache_dir) / REGISTERED_FILE, "w") as f:
+        json.dump(registered, f, indent=2)
+
+
+def is_registered(registered, sensor_id, fingerprint, version, checksum=None):
+    """
+    True when the registry's current model for the sensor (version, and
+    checksum when known) is the one uploaded for this exact fingerprint.
+    """
+    entry = registered.get(str(sensor_id))
+    if not isinstance(fingerprint, str) or entry is None or entry["fingerprint"] != fingerprint:
+        return False
+    if version is None or entry["version"] != version:
+        return False
+    return checksum is None or entry["checksum"] is None or entry["checksum"] == checksum
@@ -0,0 +1,119 @@
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from utils import training
+
+
+# Engineered AQ columns per training variant. Every variant is a column subset
+# of the complete feature view, so one read serves them all.
+FEATURE_SETS = {
+    "baseline": [],
+    "rolling": ["pm25_rolling_3d"],
+    "nearby": ["pm25_nearby_avg"],
+    "lagged_1d": ["pm25_lag_1d"],
+    "lagged_2d": ["pm25_lag_1d", "pm25_lag_2d"],
+    "lagged_3d": ["pm25_lag_1d", "pm25_lag_2d", "pm25_lag_3d"],
+    "complete": ["pm25_rolling_3d", "pm25_lag_1d", "pm25_lag_2d", "pm25_lag_3d", "pm25_nearby_avg"],
+}
+
+AQ_FEATURES = ["pm25_rolling_3d", "pm25_lag_1d", "pm25_lag_2d", "pm25_lag_3d", "pm25_nearby_avg"]
+
+# Metadata columns never used for training
+DROP_COLS = ["city", "street", "country", "latitude", "longitude", "aqicn_url"]
+
+
+def _compact(df, target=training.TARGET):
+    """Keep only training columns and downcast them (XGBoost trains on float32 anyway)."""
+    df = df.drop(columns=[c for c in DROP_COLS if c in df.columns])
+    df["date"] = pd.to_datetime(df["date"]).dt.tz_localize(None)
+    df["sensor_id"] = df["sensor_id"].astype("int32")
+
+    float_cols = [
+        c for c in df.columns
+        if c != target and pd.api.types.is_float_dtype(df[c])
+    ]
+    df[float_cols] = df[float_cols].astype(np.float32)
+    df[target] = df[target].astype("float64")
+
+    return _columnar(df.sort_values(["sensor_id", "date"]).reset_index(drop=True))
+
+
+def _columnar(df):
+    """
+    Rebuild df with one block per column (no data copy).
+
+    Pandas can only project columns without copying when they do not have to
+    be gathered out of a shared 2-D block.
+    """
+    return pd.DataFrame({c: df[c].to_numpy() for c in df.columns}, index=df.index, copy=False)
+
+
+def load_training_frame(feature_view, cache_path=None, max_age_hours=None, refresh=False, target=training.TARGET):
+    """
+    Read the complete feature view once and keep it in a local Parquet cache.
+
+    The cache is reused while it is younger than max_age_hours (None = no
+    expiry). Pass refresh=True to force a new read from the feature store.
+    """
+    cache_path = Path(cache_path) if cache_path else None
+
+    if cache_path is not None and cache_path.exists() and not refresh:
+        age_hours = (time.time() - cache_path.stat().st_mtime) / 3600
+        if max_age_hours is None or age_hours < max_age_hours:
+            df = _columnar(pd.read_parquet(cache_path))
+            print(f"📦 Loaded {len(df):,} rows from local cache {cache_path.name} ({age_hours:.1f}h old)")
+            return df
+
+    df = _compact(feature_view.query.read(), target=target)
+    print(f"✔ Read {len(df):,} rows × {df.shape[1]} columns from {feature_view.name}")
+
+    if cache_path is not None:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        df.to_parquet(cache_path, index=False)
+        print(f"💾 Cached training frame to {cache_path}")
+
+    return df
+
+
+def feature_set_columns(columns, feature_name):
+    """Columns of the complete frame that belong to one training variant."""
+    keep = set(FEATURE_SETS[feature_name])
+    return [c for c in columns if c not in AQ_FEATURES or c in keep]
+
+
+def project_feature_set(df, feature_name):
+    """Return the variant's columns of df as a new frame that owns its data."""
+    return df[feature_set_columns(df.columns, feature_name)].copy()
+
+
+def build_feature_data(df, feature_names=None):
+    """Return dict: feature_name → projected DataFrame"""
+    feature_names = feature_names or list(FEATURE_SETS)
+    return {name: project_feature_set(df, name) for name in feature_names}
+
+
+def partition_feature_sets(df, feature_names=None, target=training.TARGET):
+    """
+    Partition the complete frame by sensor once and project every variant
+    per sensor.
+
+    Returns the same {feature_name: {sensor_id: DataFrame}} mapping as
+    training.partition_feature_data, without re-sorting or re-grouping per
+    variant.
+    """
+    feature_names = feature_names or list(FEATURE_SETS)
+    sensor_frames = {
+        sensor_id: _columnar(sensor_df)
+        for sensor_id, sensor_df in training.partition_by_sensor(df, target=target).items()
+    }
+
+    return {
+        name: {
+            sensor_id: project_feature_set(sensor_df, name)
+            for sensor_id, sensor_df in sensor_frames.items()
+        }
+        for name in feature_names
+    }
@@ -1,3 +1,8 @@
+import json
+import os
+import struct
+import zlib
+
 import pandas as pd
 import matplotlib.pyplot as plt
 from matplotlib.patches import Patch
@@ -7,6 +12,16 @@ import matplotlib.colors as mcolors
 from scipy.spatial.distance import cdist
 from datetime import datetime
 
+from utils import heatmap, interpolation
+
+
+GRID_MAGIC = b"PMGR"
+GRID_VERSION = 1
+GRID_HEADER = struct.Struct("<4sBBBxHHH2x4d")  # magic, version, dtype, compression, horizons, rows, cols, bounds
+GRID_HORIZON = struct.Struct("<h2xff")         # days_ahead, scale, offset
+GRID_DTYPES = {"uint8": 1, "float16": 2}
+GRID_NODATA = 255                              # uint8 code for cells without a value
+
 
 def plot_air_quality_forecast(city: str, street: str, df: pd.DataFrame, file_path: str, hindcast=False):
     plt.close('all')
@@ -82,56 +97,50 @@ def plot_pm25_idw_heatmap(
     grid_resolution=800,
     power=2,
 ):
-    df_day = predictions[predictions["date"] == forecast_date].copy()
-
-    # Determine which column to use
-    is_today = forecast_date.date() == today
-    pm25_column = "pm25" if is_today else "predicted_pm25"
+    layout = interpolation.SensorLayout(sensor_locations)
+    pm25_values = layout.values(predictions, [forecast_date], today)[:, 0]
 
-    if pm25_column not in df_day.columns:
-        raise ValueError(f"Required column '{pm25_column}' not found for {forecast_date}")
-
-    # Collect sensor coordinates + PM2.5 values
-    sensor_coords_list = []
-    pm25_values_list = []
+    if np.isnan(pm25_values).all():
+        raise ValueError(f"No valid sensor data for {forecast_date}")
 
-    for sid in df_day["sensor_id"].unique():
-        if sid not in sensor_locations:
-            continue
+    # IDW interpolation (weights cached per sensor layout; sensors without a value are left out)
+    idw_result = layout.interpolator(grid_bounds, grid_resolution, power).interpolate(pm25_values)
+    render_idw_heatmap(idw_result, grid_bounds, path)
 
-        row = df_day[df_day["sensor_id"] == sid].iloc[0]
-        val = row.get(pm25_column)
 
-        if pd.isna(val):
-            continue
+def idw_forecast_grids(
+    predictions: pd.DataFrame,
+    sensor_locations: dict,
+    forecast_dates,
+    grid_bounds: tuple,
+    today: datetime.date,
+    grid_resolution=800,
+    power=2,
+    k=None,
+    radius=None,
+):
+    """
+    IDW grids for several forecast dates from one shared weight matrix.
 
-        try:
-            val = float(val)
-        except:
-            continue
+    Uses the same values as plot_pm25_idw_heatmap (pm25 for today,
+    predicted_pm25 otherwise); sensors without a value on a date are left
+    out of that date's weights. k / radius (degrees) limit each grid point
+    to its nearest sensors. Returns array[dates, res, res].
+    """
+    layout = interpolation.SensorLayout(sensor_locations)
+    values = layout.values(predictions, forecast_dates, today)
+    if np.isnan(values).all():
+        raise ValueError("No valid sensor data for the forecast dates")
 
-        sensor_coords_list.append([
-            sensor_locations[sid]["longitude"],
-            sensor_locations[sid]["latitude"]
-        ])
-        pm25_values_list.append(val)
+    return layout.interpolator(grid_bounds, grid_resolution, power, k=k, radius=radius).interpolate(values)
 
-    sensor_coords = np.array(sensor_coords_list, dtype=np.float64)
-    pm25_values = np.array(pm25_values_list, dtype=np.float64)
 
-    if len(sensor_coords) == 0:
-        raise ValueError(f"No valid sensor data for {forecast_date}")
+def render_idw_heatmap(idw_result, grid_bounds: tuple, path: str):
+    """Save one interpolated grid as a transparent AQI-coloured PNG covering grid_bounds."""
+    if np.isnan(idw_result).all():
+        raise ValueError("No valid sensor data for this grid")
 
-    # Build grid
     min_lon, min_lat, max_lon, max_lat = grid_bounds
-    lon_grid = np.linspace(min_lon, max_lon, grid_resolution)
-    lat_grid = np.linspace(min_lat, max_lat, grid_resolution)
-    lon_mesh, lat_mesh = np.meshgrid(lon_grid, lat_grid)
-    grid_points = np.column_stack([lon_mesh.ravel(), lat_mesh.ravel()])
-
-    # IDW interpolation
-    idw_result = idw_interpolation(sensor_coords, pm25_values, grid_points, lon_mesh, power=power)
-
     vmin = max(0, np.nanmin(idw_result))
     vmax = np.nanmax(idw_result)
 
@@ -139,12 +148,7 @@ def plot_pm25_idw_heatmap(
     vmax = max(vmax, 500)
 
     # Build AQI colormap (full range)
-    category_colors = [
-        "#00e400", "#7de400", "#ffff00", "#ffb000",
-        "#ff7e00", "#ff4000", "#ff0000", "#c0007f",
-        "#8f3f97", "#7e0023"
-    ]
-    aqi_cmap = mcolors.LinearSegmentedColormap.from_list("aqi", category_colors, N=512)
+    aqi_cmap = mcolors.LinearSegmentedColormap.from_list("aqi", heatmap.AQI_COLORS, N=512)
 
     # Render
     plt.close("all")
@@ -167,3 +171,131 @@ def plot_pm25_idw_heatmap(
 
     fig.savefig(path, dpi=300, bbox_inches="tight", pad_inches=0, transparent=True)
     plt.close(fig)
+
+
+def export_grid_binary(grids, grid_bounds: tuple, path: str, days_ahead=None, dtype="uint8", compress=True):
+    """
+    Write one or more interpolated grids (array[res, res] or array[H, res, res],
+    row 0 = min latitude) as a compact binary file for client-side colouring.
+
+    Layout (little-endian): a 48-byte header (GRID_HEADER: b"PMGR", version,
+    dtype 1=uint8 / 2=float16, compression 0=none / 1=zlib, horizons, rows,
+    cols, min_lon, min_lat, max_lon, max_lat), then 12 bytes per horizon
+    (GRID_HORIZON: days_ahead, scale, offset), then the cells of every
+    horizon in row-major order, zlib-compressed when compression is 1.
+    A uint8 cell decodes to offset + code * scale, with 255 meaning no
+    value; float16 cells are the values themselves (scale 1, offset 0).
+    """
+    if dtype not in GRID_DTYPES:
+        raise ValueError(f"dtype must be one of {sorted(GRID_DTYPES)}")
+    grids = np.asarray(grids, dtype=np.float32)
+    if grids.ndim == 2:
+        grids = grids[None]
+    horizons, rows, cols = grids.shape
+    days_ahead = list(range(horizons)) if days_ahead is None else [int(d) for d in days_ahead]
+    if len(days_ahead) != horizons:
+        raise ValueError("days_ahead needs one entry per grid")
+
+    meta = []
+    if dtype == "uint8":
+        cells = np.full(grids.shape, GRID_NODATA, dtype=np.uint8)
+        for h, grid in enumerate(grids):
+            valid = ~np.isnan(grid)
+            if not valid.any():
+                meta.append((days_ahead[h], 1.0, 0.0))
+                continue
+            offset, top = float(grid[valid].min()), float(grid[valid].max())
+            scale = (top - offset) / (GRID_NODATA - 1) or 1.0
+            cells[h][valid] = np.rint((grid[valid] - offset) / scale).astype(np.uint8)
+            meta.append((days_ahead[h], scale, offset))
+    else:
+        cells = grids.astype(np.float16)
+        meta = [(d, 1.0, 0.0) for d in days_ahead]
+
+    payload = cells.tobytes()
+    if compress:
+        payload = zlib.compress(payload, 6)
+
+    header = GRID_HEADER.pack(
+        GRID_MAGIC, GRID_VERSION, GRID_DTYPES[dtype], int(compress), horizons, rows, cols, *map(float, grid_bounds)
+    )
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(header)
+        for entry in meta:
+            f.write(GRID_HORIZON.pack(*entry))
+        f.write(payload)
+    os.replace(tmp, path)
+    return path
+
+
+def read_grid_binary(path: str):
+    """Decode a file written by export_grid_binary into (grids[H, rows, cols] float32, grid_bounds, days_ahead)."""
+    with open(path, "rb") as f:
+        data = f.read()
+
+    magic, version, dtype_code, compression, horizons, rows, cols, *bounds = GRID_HEADER.unpack_from(data)
+    if magic != GRID_MAGIC or version != GRID_VERSION:
+        raise ValueError(f"{path} is not a version {GRID_VERSION} grid file")
+    meta = [GRID_HORIZON.unpack_from(data, GRID_HEADER.size + h * GRID_HORIZON.size) for h in range(horizons)]
+
+    payload = data[GRID_HEADER.size + horizons * GRID_HORIZON.size:]
+    if compression:
+        payload = zlib.decompress(payload)
+
+    if dtype_code == GRID_DTYPES["uint8"]:
+        cells = np.frombuffer(payload, dtype=np.uint8).reshape(horizons, rows, cols)
+        grids = np.empty(cells.shape, dtype=np.float32)
+        for h, (_, scale, offset) in enumerate(meta):
+            grids[h] = offset + cells[h] * np.float32(scale)
+        grids[cells == GRID_NODATA] = np.nan
+    else:
+        grids = np.frombuffer(payload, dtype=np.float16).reshape(horizons, rows, cols).astype(np.float32)
+
+    return grids, tuple(bounds), [d for d, _, _ in meta]
+
+
+def _chart_columns(frame: pd.DataFrame, value: str):
+    """Pivot rows to (ISO dates, {sensor_id: [value or None per date]}), rounded to 0.1."""
+    table = frame.pivot_table(index="sensor_id", columns="date", values=value, aggfunc="last").round(1)
+    table = table.reindex(columns=sorted(table.columns))
+    dates = [pd.Timestamp(d).strftime("%Y-%m-%d") for d in table.columns]
+    values = table.astype(object).where(table.notna(), None)
+    return dates, {str(sid): row.tolist() for sid, row in values.iterrows()}
+
+
+def export_chart_data(forecasts: pd.DataFrame, path: str, hindcasts: pd.DataFrame = None, generated=None):
+    """
+    Write the per-sensor forecast (and hindcast) series as one columnar JSON
+    file that the frontend charts on demand, replacing the per-sensor PNGs:
+
+        {"generated": "YYYY-MM-DD",
+         "forecast": {"dates": [...], "sensors": {sensor_id: [predicted, ...]}},
+         "hindcast": {"dates": [...], "sensors": {sensor_id: {"predicted": [...], "actual": [...]}}}}
+
+    forecasts needs sensor_id, date and predicted_pm25; hindcasts also pm25.
+    Every series is aligned to its section's dates, with null for missing days.
+    """
+    forecast_dates, forecast_series = _chart_columns(forecasts, "predicted_pm25")
+    payload = {
+        "generated": str(generated or datetime.today().date()),
+        "forecast": {"dates": forecast_dates, "sensors": forecast_series},
+    }
+
+    if hindcasts is not None and not hindcasts.empty:
+        dates, predicted = _chart_columns(hindcasts, "predicted_pm25")
+        actual_dates, actual = _chart_columns(hindcasts, "pm25")
+        actual = {sid: dict(zip(actual_dates, series)) for sid, series in actual.items()}
+        payload["hindcast"] = {
+            "dates": dates,
+            "sensors": {
+                sid: {"predicted": series, "actual": [actual.get(sid, {}).get(d) for d in dates]}
+                for sid, series in predicted.items()
+            },
+        }
+
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(payload, f, separators=(",", ":"))
+    os.replace(tmp, path)
+    return path